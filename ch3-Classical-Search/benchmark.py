@@ -0,0 +1,296 @@
+import os
+import sys
+
+# the repo root (utils) and the local search chapter, for `python benchmark.py` from anywhere
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [here, os.path.join(here, '..'), os.path.join(here, '..', 'ch4-Non-Classical-Search')]
+
+from search import *
+from heuristics import manhattan_heuristic, Landmarks, landmark_heuristic
+import local_search
+import json
+import time
+import random
+import resource
+import argparse
+
+# Benchmarks for the classical and local search algorithms.
+#   python benchmark.py --output results.json                 # run and save
+#   python benchmark.py --baseline results.json               # fail on regression
+# Every run is done in a forked process (so peak RSS is per run) on an
+# InstrumentedProblem, with a node and time budget (BudgetedProblem).
+
+# Solvable instance: random walk of the given depth back from the goal
+def random_walk_state(problem, depth, seed=None):
+    rng = random.Random(seed)
+    state, previous = problem.goal, None
+    for _ in range(depth):
+        actions = [a for a in problem.actions(state) if problem.result(state, a) != previous]
+        previous, state = state, problem.result(state, rng.choice(actions))
+    return state
+
+# Seeded random permutations, kept only when check_solvability accepts them
+def eight_puzzle_instances(count=5, seed=0):
+    rng, instances = random.Random(seed), []
+    while len(instances) < count:
+        tiles = list(range(9))
+        rng.shuffle(tiles)
+        problem = EightPuzzle(tuple(tiles))
+        if problem.check_solvability(problem.initial):
+            instances.append(problem)
+    return instances
+
+def fifteen_puzzle_instances(count=3, seed=0):
+    rng, instances = random.Random(seed), []
+    while len(instances) < count:
+        tiles = list(range(16))
+        rng.shuffle(tiles)
+        problem = SlidingTilePuzzle(tuple(tiles), n=4)
+        if problem.check_solvability(problem.initial):
+            instances.append(problem)
+    return instances
+
+def nqueens_instances(sizes=(4, 6, 8)):
+    return [local_search.NQueensProblem(n) for n in sizes]
+
+def complete_nqueens_instances(sizes=(8, 16), seed=0):
+    random.seed(seed)  # CompleteStateNQueens draws its initial state from random
+    return [local_search.CompleteStateNQueens(n) for n in sizes]
+
+def classical_algorithms(h=None):
+    """Name -> search(problem); h(problem) builds the heuristic (default problem.h)."""
+    h = h or (lambda problem: problem.h)
+    return {
+        'breadth_first_tree_search': breadth_first_tree_search,
+        'depth_first_tree_search': depth_first_tree_search,
+        'breadth_first_graph_search': breadth_first_graph_search,
+        'depth_first_graph_search': depth_first_graph_search,
+        'uniform_cost_search': uniform_cost_search,
+        'greedy_best_first_graph_search': lambda p: greedy_best_first_graph_search(p, h(p)),
+        'astar_search': lambda p: astar_search(p, h(p)),
+        'weighted_astar_search': lambda p: weighted_astar_search(p, h(p), 2.0),
+        'arastar_search': lambda p: arastar_search(p, h(p)),
+        'beam_search': lambda p: beam_search(p, 100, h(p)),
+        'idastar': lambda p: idastar(p, h(p)),
+        'recursive_best_first_search': lambda p: recursive_best_first_search(p, h(p)),
+        'iterative_deepening_search': iterative_deepening_search,
+        'bidirectional_search': lambda p: bidirectional_search(p, h(p)),
+        'sma_star_search': lambda p: sma_star_search(p, 10000, h(p)),
+    }
+
+def uninformed_algorithms():
+    names = ('breadth_first_tree_search', 'depth_first_tree_search', 'breadth_first_graph_search',
+             'depth_first_graph_search', 'uniform_cost_search', 'iterative_deepening_search')
+    return {name: fn for name, fn in classical_algorithms().items() if name in names}
+
+def local_algorithms():
+    return {
+        'hill_climbing': local_search.hill_climbing,
+        'hill_climbing_sideways': lambda p: local_search.hill_climbing_sideways(p, 100),
+        'stochastic_hill_climbing': local_search.stochastic_hill_climbing,
+        'first_choice_hill_climbing': local_search.first_choice_hill_climbing,
+        'random_restart_hill_climbing': local_search.random_restart_hill_climbing,
+        'local_beam_search': lambda p: local_search.local_beam_search(p, 10, 2000),
+        'stochastic_local_beam_search': lambda p: local_search.stochastic_local_beam_search(p, 10, 2000),
+        'simulated_annealing': local_search.simulated_annealing,
+        'nqueens_genetic_algorithm': lambda p: local_search.nqueens_genetic_algorithm(p, 1000, n=100, seed=random.randrange(2 ** 32)),
+    }
+
+# suite name -> (instances(seed), algorithms)
+def suites():
+    return {
+        'eight_puzzle': (lambda seed: eight_puzzle_instances(5, seed), classical_algorithms()),
+        'fifteen_puzzle': (lambda seed: fifteen_puzzle_instances(3, seed), classical_algorithms(manhattan_heuristic)),
+        'nqueens': (lambda seed: nqueens_instances(), uninformed_algorithms()),
+        'nqueens_local': (lambda seed: complete_nqueens_instances(seed=seed), local_algorithms()),
+    }
+
+def run_one(algorithm, problem, max_nodes, timeout, seed, conn):
+    """Run one search in this (forked) process and send a result record through conn."""
+    random.seed(seed)
+    stats = SearchStats()
+    budgeted = BudgetedProblem(problem, max_nodes, timeout)
+    start = time.perf_counter()
+    try:
+        result = algorithm(InstrumentedProblem(budgeted, stats))
+        status = 'solved'
+    except SearchBudgetExceeded as exc:
+        result, status = None, exc.args[0]
+    except Exception as exc:  # a broken algorithm must not stop the benchmark
+        result, status = None, f'error: {exc!r}'
+    seconds = time.perf_counter() - start
+    if isinstance(result, Node):
+        cost = result.path_cost  # solution quality: path cost
+    elif result is None or isinstance(result, str):
+        cost, status = None, 'failure' if status == 'solved' else status
+    else:
+        cost = -problem.value(result)  # local search: conflicts left in the final state
+        status = 'solved' if problem.goal_test(result) else 'local_optimum'
+    conn.send({'status': status, 'cost': cost, 'expanded': stats.expanded, 'generated': stats.generated,
+               'seconds': seconds, 'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss})
+    conn.close()
+
+def run_suite(name, seed=0, max_nodes=200000, timeout=10.0, algorithms=None):
+    make_instances, all_algorithms = suites()[name]
+    ctx = multiprocessing.get_context('fork')
+    results = []
+    for algorithm_name, algorithm in all_algorithms.items():
+        if algorithms and algorithm_name not in algorithms:
+            continue
+        runs = []
+        for i, problem in enumerate(make_instances(seed)):
+            receiver, sender = ctx.Pipe(duplex=False)
+            process = ctx.Process(target=run_one, args=(algorithm, problem, max_nodes, timeout, seed + i, sender))
+            process.start()
+            sender.close()
+            try:
+                runs.append(receiver.recv())
+            except EOFError:  # crashed (e.g. out of memory)
+                runs.append({'status': 'error', 'cost': None, 'expanded': 0, 'generated': 0,
+                             'seconds': 0.0, 'peak_rss_kb': 0})
+            process.join()
+        if not runs:
+            continue
+        solved = [r for r in runs if r['status'] == 'solved']
+        expanded, seconds = sum(r['expanded'] for r in runs), sum(r['seconds'] for r in runs)
+        results.append({
+            'suite': name, 'algorithm': algorithm_name, 'instances': len(runs), 'solved': len(solved),
+            'expanded': expanded, 'seconds': seconds,
+            'expansions_per_sec': expanded / seconds if seconds else 0.0,
+            'peak_rss_kb': max(r['peak_rss_kb'] for r in runs),
+            'mean_cost': sum(r['cost'] for r in solved) / len(solved) if solved else None,
+            'runs': runs,
+        })
+    return results
+
+def run_benchmarks(names=None, **kwargs):
+    return [r for name in (names or suites()) for r in run_suite(name, **kwargs)]
+
+# Regressions of results against a baseline: fewer instances solved, worse mean cost,
+# or expansions/sec more than tolerance below the baseline.
+def compare(results, baseline, tolerance=0.25):
+    current = {(r['suite'], r['algorithm']): r for r in results}
+    regressions = []
+    for base in baseline:
+        key = (base['suite'], base['algorithm'])
+        r = current.get(key)
+        if r is None:
+            continue  # not run this time
+        name = '/'.join(key)
+        if r['solved'] < base['solved']:
+            regressions.append(f"{name}: solved {r['solved']} < baseline {base['solved']}")
+        if r['mean_cost'] is not None and base['mean_cost'] is not None and r['mean_cost'] > base['mean_cost']:
+            regressions.append(f"{name}: mean cost {r['mean_cost']:.2f} > baseline {base['mean_cost']:.2f}")
+        if r['expansions_per_sec'] < (1 - tolerance) * base['expansions_per_sec']:
+            regressions.append(f"{name}: {r['expansions_per_sec']:.0f} exp/s < baseline "
+                               f"{base['expansions_per_sec']:.0f} exp/s (-{tolerance:.0%} allowed)")
+    return regressions
+
+# Node-expansion throughput of graph searches on EightPuzzle of increasing difficulty
+def benchmark_graph_search(searches=None, depths=(8, 12, 16, 20), seed=0):
+    searches = searches or [breadth_first_graph_search, depth_first_graph_search]
+    results = []
+    for depth in depths:
+        initial = random_walk_state(EightPuzzle(None), depth, seed + depth)
+        for search in searches:
+            _, stats = instrumented_search(search, EightPuzzle(initial))
+            results.append({'search': search.__name__, 'depth': depth, 'expanded': stats.expanded,
+                            'seconds': stats.wall_time, 'expansions_per_sec': stats.expanded / stats.wall_time})
+    return results
+
+# Speedup of parallel_astar_search (HDA*) over its 1-worker run on a 15-puzzle instance
+def benchmark_parallel_astar(workers=(1, 2, 4, 8, 16), depth=50, seed=0):
+    initial = random_walk_state(SlidingTilePuzzle(None, n=4), depth, seed)
+    problem = SlidingTilePuzzle(initial, n=4)
+    h = manhattan_heuristic(problem)
+    generated = []  # states generated by a sequential A* run, to check how HDA* splits them
+    astar_search(problem, lambda node: generated.append(node.state) or h(node))
+    generated = set(generated)
+    results = []
+    for w in workers:
+        check_partition_balance(generated, w)
+        start = time.perf_counter()
+        node = parallel_astar_search(problem, h, w)
+        elapsed = time.perf_counter() - start
+        results.append({'workers': w, 'seconds': elapsed, 'cost': node.path_cost,
+                        'speedup': results[0]['seconds'] / elapsed if results else 1.0})
+    return results
+
+# Road-map like graph: a side x side grid with jittered coordinates, diagonal shortcuts
+# and edge costs of 1 to 1.3 times the straight-line distance
+def random_road_graph(side=100, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = np.arange(side * side).reshape(side, side)
+    coords = np.column_stack([(ids % side).ravel(), (ids // side).ravel()]) + rng.uniform(-0.3, 0.3, (side * side, 2))
+    pairs = [(ids[:, :-1], ids[:, 1:]), (ids[:-1, :], ids[1:, :]), (ids[:-1, :-1], ids[1:, 1:])]
+    u = np.concatenate([a.ravel() for a, _ in pairs])
+    v = np.concatenate([b.ravel() for _, b in pairs])
+    keep = rng.random(len(u)) < 0.8  # some roads missing
+    u, v = u[keep], v[keep]
+    w = np.hypot(*(coords[u] - coords[v]).T) * rng.uniform(1.0, 1.3, len(u))
+    return CSRGraph.from_edges(np.column_stack([u, v, w]), side * side, undirected=True, coords=coords)
+
+# Query time of A* with ALT landmark heuristics against the straight-line h, and the
+# number of queries after which the preprocessing has paid for itself
+def benchmark_landmarks(side=150, queries=50, counts=(1, 4, 8, 16), seed=0):
+    graph = random_road_graph(side, seed)
+    rng = random.Random(seed)
+    pairs = [(rng.randrange(graph.n), rng.randrange(graph.n)) for _ in range(queries)]
+
+    def run(search, make_h):
+        expanded, start = 0, time.perf_counter()
+        for s, t in pairs:
+            stats = SearchStats()
+            problem = InstrumentedProblem(GraphProblem(s, t, graph), stats)
+            search(problem, make_h(problem))
+            expanded += stats.expanded
+        return (time.perf_counter() - start) / queries, expanded / queries
+
+    results = []
+    for name, search, vector in (('astar_search', astar_search, False), ('graph_astar_search', graph_astar_search, True)):
+        base_seconds, base_expanded = run(search, lambda p: p.h_vector if vector else p.h)
+        results.append({'search': name, 'landmarks': 0, 'preprocess_seconds': 0.0,
+                        'query_seconds': base_seconds, 'expanded': base_expanded, 'speedup': 1.0, 'break_even': 0})
+        for k in counts:
+            start = time.perf_counter()
+            landmarks = Landmarks.build(graph, k, seed)
+            preprocess = time.perf_counter() - start
+            seconds, expanded = run(search, lambda p: landmark_heuristic(p, landmarks).vector if vector
+                                    else landmark_heuristic(p, landmarks))
+            saved = base_seconds - seconds
+            results.append({'search': name, 'landmarks': k, 'preprocess_seconds': preprocess,
+                            'query_seconds': seconds, 'expanded': expanded, 'speedup': base_seconds / seconds,
+                            'break_even': int(np.ceil(preprocess / saved)) if saved > 0 else None})
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the search algorithms.')
+    parser.add_argument('--suite', action='append', choices=sorted(suites()), help='suites to run (default: all)')
+    parser.add_argument('--algorithm', action='append', help='algorithms to run (default: all)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-nodes', type=int, default=200000, help='expansion budget per run')
+    parser.add_argument('--timeout', type=float, default=10.0, help='seconds per run')
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed expansions/sec drop')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.suite, seed=args.seed, max_nodes=args.max_nodes,
+                             timeout=args.timeout, algorithms=args.algorithm)
+    for r in results:
+        cost = f"{r['mean_cost']:.2f}" if r['mean_cost'] is not None else '-'
+        print(f"{r['suite']:<15} {r['algorithm']:<31} solved {r['solved']}/{r['instances']} "
+              f"cost {cost:>7} {r['expansions_per_sec']:10.0f} exp/s {r['peak_rss_kb']:8d} KB")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print('\nPERFORMANCE REGRESSION')
+            for message in regressions:
+                print('  ' + message)
+            sys.exit(1)
+        print('\nNo regression against', args.baseline)
@@ -0,0 +1,216 @@
+from search import *
+import os
+
+# Heuristics for SlidingTilePuzzle: Manhattan distance and additive pattern databases.
+# Heuristics for GraphProblem: landmarks (ALT).
+
+# The goal states of puzzle (one, or several with a goal set)
+def puzzle_goals(puzzle):
+    return sorted(puzzle.goal_states())
+
+# Manhattan distance with a precomputed table[cell][tile]
+def manhattan_table(puzzle, goal=None):
+    n = puzzle.n
+    goal_cell = {t: i for i, t in enumerate(puzzle.decode(puzzle.goal if goal is None else goal))}
+    return [[0 if t == 0 else abs(c // n - goal_cell[t] // n) + abs(c % n - goal_cell[t] % n)
+             for t in range(puzzle.size)] for c in range(puzzle.size)]
+
+# With several goals: the minimum over one table per goal
+def manhattan_heuristic(puzzle):
+    tables = [manhattan_table(puzzle, goal) for goal in puzzle_goals(puzzle)]
+    bits, mask, size = puzzle.bits, puzzle.mask, puzzle.size
+
+    if len(tables) == 1:
+        table = tables[0]
+
+        def h(node):
+            state, total = node.state, 0
+            for c in range(size):
+                total += table[c][(state >> (bits * c)) & mask]
+            return total
+        return h
+
+    def multi_goal_h(node):
+        state = node.state
+        tiles = [(c, (state >> (bits * c)) & mask) for c in range(size)]
+        return min(sum(table[c][t] for c, t in tiles) for table in tables)
+    return multi_goal_h
+
+
+class PatternDatabase:
+    """Disjoint (additive) pattern database for a SlidingTilePuzzle.
+    Only moves of the pattern tiles are counted, so the values of PDBs over
+    disjoint patterns can be summed and stay admissible. The table is a
+    uint8 array indexed by the rank of the cells of the pattern tiles as a
+    partial permutation (n!/(n-k)! entries for k tiles on n cells), built by
+    a breadth-first search backward from the goal (from all the goals at once
+    for a puzzle with several, so the value is the min over them)."""
+
+    def __init__(self, puzzle, pattern, table=None):
+        self.puzzle = puzzle
+        self.pattern = tuple(pattern)
+        # rank weights: digit i (cell i among the cells not used by 0..i-1) has radix size - i
+        self.weights = [1]
+        for i in range(len(self.pattern)):
+            self.weights.append(self.weights[-1] * (puzzle.size - i))
+        if table is not None and len(table) != self.weights[-1]:
+            raise ValueError(f"Pattern database table has {len(table)} entries, expected {self.weights[-1]}.")
+        self.table = table
+
+    def rank(self, cells):
+        """Ranks of an (m, j) array of distinct cells per row, j <= len(pattern) + 1."""
+        cells = cells.astype(np.int64)
+        ranks = cells[:, 0].copy()
+        for i in range(1, cells.shape[1]):
+            digit = cells[:, i] - (cells[:, :i] < cells[:, i, None]).sum(axis=1)
+            ranks += digit * self.weights[i]
+        return ranks
+
+    def build(self):
+        """0-1 breadth-first search over ranked (pattern cells, blank cell) states,
+        vectorized per level with NumPy; blank-only moves cost 0, pattern tile moves
+        cost 1. The frontier is kept as int8 cell arrays, so no unranking is needed."""
+        puzzle, k, size = self.puzzle, len(self.pattern), self.puzzle.size
+        unvisited = np.uint8(255)
+        dist = np.full(self.weights[-1] * (size - k), unvisited, dtype=np.uint8)  # blank is the last digit
+        goals = [puzzle.decode(goal) for goal in puzzle_goals(puzzle)]
+        starts = np.array([[goal.index(t) for t in self.pattern] + [goal.index(0)] for goal in goals], dtype=np.int8)
+        targets = [np.array([puzzle.targets[b].get(a, -1) for b in range(size)]) for a in puzzle.directions]
+
+        def successors(cells, moving_tile):
+            blank = cells[:, -1]
+            result = []
+            for target in targets:
+                new_blank = target[blank]
+                hit = cells[:, :-1] == new_blank[:, None]  # pattern tile on the cell the blank moves to
+                keep = (new_blank >= 0) & (hit.any(axis=1) == moving_tile)
+                new_cells = cells[keep]
+                if moving_tile:
+                    new_cells[:, :-1][hit[keep]] = blank[keep]
+                new_cells[:, -1] = new_blank[keep]
+                result.append(new_cells)
+            return unvisited_states(np.concatenate(result))
+
+        def unvisited_states(cells):
+            ranks, first = np.unique(self.rank(cells), return_index=True)
+            new = dist[ranks] == unvisited
+            return cells[first[new]], ranks[new]
+
+        frontier, ranks = unvisited_states(starts)
+        d = 0
+        dist[ranks] = 0
+        while len(frontier):
+            level = [frontier]
+            while len(frontier):  # zero-cost closure of this level
+                frontier, ranks = successors(frontier, False)
+                dist[ranks] = d
+                level.append(frontier)
+            d += 1
+            frontier, ranks = successors(np.concatenate(level), True)
+            dist[ranks] = d
+        self.table = dist.reshape(size - k, -1).min(axis=0)  # best over blank positions
+        return self
+
+    def save(self, path):
+        np.save(path, self.table)
+
+    @classmethod
+    def load(cls, puzzle, pattern, path, mmap=True):
+        return cls(puzzle, pattern, np.load(path, mmap_mode='r' if mmap else None))
+
+    def __call__(self, state):
+        cells = [0] * self.puzzle.size
+        bits, mask = self.puzzle.bits, self.puzzle.mask
+        for c in range(self.puzzle.size):
+            cells[(state >> (bits * c)) & mask] = c
+        used, index = [], 0
+        for t, w in zip(self.pattern, self.weights):
+            c = cells[t]
+            index += (c - sum(u < c for u in used)) * w
+            used.append(c)
+        return int(self.table[index])
+
+
+# Sum of disjoint PDBs, each built once and then loaded (memory-mapped) from directory
+def pattern_database_heuristic(puzzle, patterns, directory=None):
+    pdbs = []
+    for pattern in patterns:
+        path = None
+        if directory is not None:
+            goals = '-'.join(f'{goal:x}' for goal in puzzle_goals(puzzle))
+            name = f"pdb-rank-{puzzle.n}-{'-'.join(map(str, pattern))}-{goals}.npy"
+            path = os.path.join(directory, name)
+        if path is not None and os.path.exists(path):
+            pdbs.append(PatternDatabase.load(puzzle, pattern, path))
+            continue
+        pdb = PatternDatabase(puzzle, pattern).build()
+        if path is not None:
+            os.makedirs(directory, exist_ok=True)
+            pdb.save(path)
+        pdbs.append(pdb)
+
+    def h(node):
+        return sum(pdb(node.state) for pdb in pdbs)
+    return h
+
+
+class Landmarks:
+    """ALT (A*, landmarks, triangle inequality) tables for a CSRGraph: for each landmark
+    L, the distances L -> v (to_vertex) and v -> L (from_vertex) for every vertex v.
+    Then d(v, t) >= d(L, t) - d(L, v) and d(v, t) >= d(v, L) - d(t, L), so the max
+    over the landmarks is an admissible (and consistent) h. Landmarks are chosen by
+    farthest selection; the tables are preprocessed once per graph and reused by all
+    queries. Tables are float64 so the bounds never round above the true distance."""
+
+    def __init__(self, landmarks, to_vertex, from_vertex):
+        self.landmarks = landmarks
+        self.to_vertex = to_vertex  # k x n
+        self.from_vertex = from_vertex  # k x n
+
+    @classmethod
+    def build(cls, graph, k=8, seed=0):
+        rng = np.random.default_rng(seed)
+        reverse = graph.reverse()
+        landmarks, to_vertex, from_vertex = [], [], []
+        closest = graph_distances(graph, int(rng.integers(graph.n)))  # from a random vertex at first
+        for i in range(min(k, graph.n)):
+            v = int(np.where(np.isfinite(closest), closest, -1.0).argmax())  # farthest from the landmarks
+            landmarks.append(v)
+            to_vertex.append(graph_distances(graph, v))
+            from_vertex.append(graph_distances(reverse, v))
+            closest = to_vertex[-1] if i == 0 else np.minimum(closest, to_vertex[-1])
+        return cls(np.array(landmarks), np.array(to_vertex), np.array(from_vertex))
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in ('landmarks', 'to_vertex', 'from_vertex'):
+            np.save(os.path.join(directory, name + '.npy'), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        return cls(*(np.load(os.path.join(directory, name + '.npy'), mmap_mode='r' if mmap else None)
+                     for name in ('landmarks', 'to_vertex', 'from_vertex')))
+
+    def bounds(self, vertices, goals):
+        """Lower bounds on the distance from each of an array of vertices to the
+        nearest of goals."""
+        goals = np.atleast_1d(goals)
+        to_goal, from_goal = self.to_vertex[:, goals, None], self.from_vertex[:, goals, None]
+        with np.errstate(invalid='ignore'):
+            best = np.fmax(to_goal - self.to_vertex[:, None, vertices],  # nan (inf - inf) carries no information
+                           self.from_vertex[:, None, vertices] - from_goal).max(axis=0).min(axis=0)
+        return np.maximum(np.nan_to_num(best, nan=0.0, posinf=np.inf), 0.0)
+
+# ALT heuristic for a GraphProblem (min over its goals) never below the straight-line
+# distance. The returned h takes a node (for astar_search and the other searches);
+# h.vector takes an array of vertices (for graph_astar_search).
+def landmark_heuristic(problem, landmarks):
+    goals = problem.goal_vertices
+
+    def vector(vertices):
+        return np.maximum(landmarks.bounds(vertices, goals), problem.h_vector(vertices))
+
+    def h(node):
+        return float(vector(np.array([node.state]))[0])
+    h.vector = vector
+    return h
@@ -1,39 +1,55 @@
 from utils import *
-from collections import deque 
+from collections import deque, namedtuple
+import os
 import sys 
+import time
+import queue
+import multiprocessing
 import numpy as np
 
 # Breadth-first tree search 
 def breadth_first_tree_search(problem) -> Node:
+    stats = search_stats(problem)
     frontier = deque([Node(problem.initial)]) # FIFO 
     while frontier:
         node = frontier.popleft()
         if problem.goal_test(node.state):
             return node 
-        frontier.extend(node.expand(problem))
+        size = len(frontier)
+        frontier.extend(node.iter_expand(problem))
+        if stats is not None:
+            stats.expansion(len(frontier) - size, len(frontier))
     return None 
 
 # Depth-first tree search 
 def depth_first_tree_search(problem) -> Node:
+    stats = search_stats(problem)
     frontier = [Node(problem.initial)] # LIFO
     while frontier:
         node = frontier.pop()
         if problem.goal_test(node.state):
             return node
-        frontier.extend(node.expand(problem))
+        size = len(frontier)
+        frontier.extend(node.iter_expand(problem))
+        if stats is not None:
+            stats.expansion(len(frontier) - size, len(frontier))
     return None
 
 # Depth-first graph search 
 def depth_first_graph_search(problem) -> Node:
+    stats = search_stats(problem)
     frontier = [Node(problem.initial)] # LIFO
-    explored = set() 
+    reached = {problem.initial}  # hashed states of explored + frontier, O(1) duplicate check
     while frontier:
         node = frontier.pop()
         if problem.goal_test(node.state):
             return node 
-        explored.add(node.state)
-        frontier.extend(child for child in node.expand(problem)
-                        if child.state not in explored and child not in frontier)
+        size = len(frontier)
+        for child in node.iter_expand(problem, reached):
+            reached.add(child.state)
+            frontier.append(child)
+        if stats is not None:
+            stats.expansion(len(frontier) - size, len(frontier))
     return None 
 
 # Breadth-first graph search 
@@ -41,26 +57,34 @@ def breadth_first_graph_search(problem) -> Node:
     node = Node(problem.initial)
     if problem.goal_test(node.state):
         return node 
+    stats = search_stats(problem)
     frontier = deque([node])
-    explored = set() 
+    reached = {node.state}  # hashed states of explored + frontier, O(1) duplicate check
     while frontier:
         node = frontier.popleft() 
-        explored.add(node.state) 
-        for child in node.expand(problem):
-            if child.state not in explored and child not in frontier: 
-                if problem.goal_test(child.state):
-                    return child 
-                frontier.append(child)
+        size = len(frontier)
+        for child in node.iter_expand(problem, reached):
+            if problem.goal_test(child.state):
+                return child 
+            reached.add(child.state)
+            frontier.append(child)
+        if stats is not None:
+            stats.expansion(len(frontier) - size, len(frontier))
     return None 
 
 # Best-first graph search 
-def best_first_graph_search(problem, f, display=False) -> Node:
+# Gives up (returns None) once timeout seconds have passed.
+def best_first_graph_search(problem, f, display=False, timeout=None) -> Node:
+    deadline = time.perf_counter() + timeout if timeout is not None else None
     f = memoize(f, 'f')   # memoize
+    stats = search_stats(problem)
     node = Node(problem.initial)
     frontier = PriorityQueue('min', f)  # open list, to be explored
     frontier.append(node) 
     explored = set()  # closed list, explored 
     while frontier:
+        if deadline is not None and time.perf_counter() > deadline:
+            return None
         node = frontier.pop()
         # check if goal state 
         if problem.goal_test(node.state):
@@ -69,72 +93,125 @@ def best_first_graph_search(problem, f, display=False) -> Node:
             return node
         # add to closed list 
         explored.add(node.state)
-        for child in node.expand(problem):  # expand child states
+        added = 0
+        for child in node.iter_expand(problem):  # expand child states
             if child.state not in explored and child not in frontier:  # add to the open list 
                 frontier.add(child) 
+                added += 1
             elif child in frontier:
                 if f(child) < frontier[child]:  # update the open list if needed 
                     del frontier[child]
                     frontier.append(child)  
+                    added += 1
+        if stats is not None:
+            stats.expansion(added, len(frontier))
     return None 
 
 # Iterative deepening A* search
-def idastar(problem, h=None) -> Node:
-    h = memoize(h or problem.h, 'h')
-
-    def dfs_contour(node, f_limit):
-        next_f = np.inf
-        if h(node) > f_limit:
-            return None, h(node)
-        if problem.goal_test(node.state):
-            return node, f_limit
-        successors = node.expand(problem)
-        for s in successors:
-            solution, newf = dfs_contour(s, f_limit)
-            if solution is not None:
-                return solution, f_limit
-            next_f = min(next_f, newf)
-        return None, next_f
-
-    node = Node(problem.initial)
-    f_limit = h(node)
+# Explicit stack (no recursion limit), successors ordered by f, the parent state is
+# never regenerated, and an optional transposition table of at most table_size
+# states keeps the best g seen in the current iteration.
+def idastar(problem, h=None, table_size=None) -> Node:
+    h = memoize_node_heuristic(h or problem.h)
+    stats = search_stats(problem)
+    root = Node(problem.initial)
+    f_limit = root.path_cost + h(root)
     while True:
         # explore with contour = limit
-        solution, f_limit = dfs_contour(node, f_limit)
-        if solution is not None:
-            return solution
-        if f_limit == np.inf:
+        next_f = np.inf
+        table = {root.state: root.path_cost}
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if problem.goal_test(node.state):
+                return node
+            exclude = (node.parent.state,) if node.parent else ()
+            successors = []
+            for s in node.iter_expand(problem, exclude):
+                f = s.path_cost + h(s)
+                if f > f_limit:
+                    next_f = min(next_f, f)
+                    continue
+                if table_size:
+                    if table.get(s.state, np.inf) <= s.path_cost:
+                        continue  # reached as cheaply in this iteration
+                    if s.state in table or len(table) < table_size:
+                        table[s.state] = s.path_cost
+                successors.append((f, s))
+            # push the best successor last so that it is popped first
+            successors.sort(key=lambda x: x[0], reverse=True)
+            stack.extend(s for _, s in successors)
+            if stats is not None:
+                stats.expansion(len(successors), len(stack))
+        if next_f == np.inf:
             return "failure"
+        f_limit = next_f
     
 # Recursive best-first search
+# Runs on an explicit stack (no recursion limit) of frames [node, f_limit, successors,
+# re-expansion]. successors is a heap of [f, count, child, expanded, g + h], so the best
+# child and the alternative (second best) f come from the top of the heap without sorting.
+# A node is re-expanded when the search comes back to it after its f was backed up;
+# the re_expanded and regenerated counts and max_depth go to the SearchStats of an
+# InstrumentedProblem, to tell when regeneration makes IDA* or SMA* the better choice.
 def recursive_best_first_search(problem, h=None) -> Node:
-    h = memoize(h or problem.h, 'h')
-    
-    def rec(problem, node, flimit):
-        if problem.goal_test(node.state):
-            return node, 0
-        successors = node.expand(problem)
-        if len(successors) == 0:
-            return None, np.inf
-        for s in successors:
-            s.f = max(s.path_cost + h(s), node.f) # update the f(n) of each visited node 
-        while True:
-            # order by the lowest f value 
-            successors.sort(key=lambda x: x.f)
+    h = memoize_node_heuristic(h or problem.h)
+    stats = search_stats(problem)
+    re_expanded = regenerated = max_depth = 0
+    counter = itertools.count()  # tie-breaker
+    inf = np.inf
+    root = Node(problem.initial)
+    root.f = h(root)
+    stack = [[root, inf, None, False]]
+    frontier = 0  # nodes in all the successor heaps
+    try:
+        while stack:
+            frame = stack[-1]
+            node, f_limit, successors, again = frame
+            if successors is None:
+                if problem.goal_test(node.state):
+                    return node
+                successors = frame[2] = []
+                node_f = node.f
+                for child in node.iter_expand(problem):
+                    static_f = child.path_cost + h(child)
+                    child.f = f = static_f if static_f > node_f else node_f  # inherit the backed-up f
+                    successors.append([f, next(counter), child, False, static_f])
+                heapq.heapify(successors)
+                n = len(successors)
+                frontier += n
+                if again:
+                    re_expanded += 1
+                    regenerated += n
+                if len(stack) > max_depth:
+                    max_depth = len(stack)
+                if stats is not None:
+                    stats.expansion(n, frontier)
+            if not successors or successors[0][0] > f_limit:
+                # back up the best f to the parent's entry for this node
+                value = successors[0][0] if successors else inf
+                stack.pop()
+                frontier -= len(successors)
+                if stack:
+                    parent = stack[-1][2]
+                    entry = parent[0]
+                    entry[0] = entry[2].f = value
+                    heapq.heapreplace(parent, entry)
+                continue
             best = successors[0]
-            if best.f > flimit:
-                return None, best.f 
-            if len(successors)>1:
-                alternative = successors[1].f 
-            else:
-                alternative = np.inf
-            result, best.f = rec(problem, best, min(alternative, flimit))
-            if result is not None:  # return the first result found 
-                return result, best.f 
-    node = Node(problem.initial) 
-    node.f = h(node)
-    result, best_f = rec(problem, node, np.inf) 
-    return result 
+            n = len(successors)
+            alternative = successors[1][0] if n > 1 else inf
+            if n > 2 and successors[2][0] < alternative:
+                alternative = successors[2][0]
+            again = best[3] or best[0] > best[4]  # expanded before
+            best[3] = True
+            stack.append([best[2], alternative if alternative < f_limit else f_limit, None, again])
+        return None
+    finally:
+        if stats is not None:
+            stats.re_expanded += re_expanded
+            stats.regenerated += regenerated
+            stats.max_depth = max(stats.max_depth, max_depth)
 
 # f(n) = g(n)
 def uniform_cost_search(problem, display=False) -> Node:
@@ -144,108 +221,648 @@ def uniform_cost_search(problem, display=False) -> Node:
 greedy_best_first_graph_search = best_first_graph_search 
 
 # f(n) = g(n) + h(n)
-def astar_search(problem, h=None, display=False) -> Node:
-    h = memoize(h or problem.h, 'h')
-    return best_first_graph_search(problem, lambda node: node.path_cost + h(node), display) 
+def astar_search(problem, h=None, display=False, timeout=None) -> Node:
+    h = memoize_heuristic(h or problem.h)
+    return best_first_graph_search(problem, lambda node: node.path_cost + h(node), display, timeout) 
+
+# Weighted A*: f(n) = g(n) + w * h(n)
+# With an admissible h the solution costs at most w times the optimal cost, and
+# usually far fewer nodes are expanded than with A*.
+def weighted_astar_search(problem, h=None, w=1.5, display=False, timeout=None) -> Node:
+    h = memoize_heuristic(h or problem.h)
+    return best_first_graph_search(problem, lambda node: node.path_cost + w * h(node), display, timeout)
+
+# Anytime Repairing A* (ARA*)
+# A series of weighted A* searches with w lowered by step after each solution. Each
+# search reuses the open list and g values of the previous one; states whose g drops
+# after they were expanded are kept in incons for the next search instead of being
+# reopened. callback(node, bound) is called with every improved solution, where
+# cost <= bound * optimal cost (h admissible). Returns the best solution once it is
+# proven optimal (w = 1) or when timeout seconds have passed.
+def arastar_search(problem, h=None, w=3.0, step=0.5, timeout=None, callback=None) -> Node:
+    deadline = time.perf_counter() + timeout if timeout is not None else None
+    h = memoize_heuristic(h or problem.h)
+    stats = search_stats(problem)
+    root = Node(problem.initial)
+    if problem.goal_test(root.state):
+        return root
+    weight = [w]
+    frontier = PriorityQueue('min', lambda node: node.path_cost + weight[0] * h(node))
+    frontier.append(root)
+    best = {root.state: root}  # lowest g found per state
+    closed, incons = set(), {}
+    solution = reported = None
+    while True:
+        # expand while some open node may still lead to a cheaper solution
+        while frontier and (solution is None or frontier[frontier.peek()] < solution.path_cost):
+            if deadline is not None and time.perf_counter() > deadline:
+                return solution
+            node = frontier.pop()
+            closed.add(node.state)
+            size = len(frontier)
+            for child in node.iter_expand(problem):
+                old = best.get(child.state)
+                if old is not None and old.path_cost <= child.path_cost:
+                    continue
+                best[child.state] = child
+                if problem.goal_test(child.state):
+                    if solution is None or child.path_cost < solution.path_cost:
+                        solution = child
+                elif child.state in closed:
+                    incons[child.state] = child
+                else:
+                    frontier.append(child)  # insert or decrease-key
+            if stats is not None:
+                stats.expansion(len(frontier) - size, len(frontier))
+        if solution is None:
+            return None
+        lower = min((n.path_cost + h(n) for n in itertools.chain(frontier, incons.values())),
+                    default=solution.path_cost)
+        bound = min(weight[0], solution.path_cost / lower) if lower > 0 else 1.0
+        if solution is not reported:
+            reported = solution
+            if callback is not None:
+                callback(solution, bound)
+        if weight[0] <= 1 or bound <= 1:
+            return solution
+        weight[0] = max(1.0, weight[0] - step)
+        items = list(frontier) + list(incons.values())
+        frontier = PriorityQueue('min', frontier.f)  # reorder for the new weight
+        frontier.extend(items)
+        closed, incons = set(), {}
+
+# Beam search
+# Breadth-first by levels, keeping only the beam_width best nodes (by f = g + h) of
+# each level, so the frontier never holds more than beam_width nodes. Incomplete:
+# returns the cheapest goal in the first level that has one, or None when the beam
+# dies out or timeout seconds have passed.
+def beam_search(problem, beam_width=100, h=None, timeout=None) -> Node:
+    deadline = time.perf_counter() + timeout if timeout is not None else None
+    h = memoize_heuristic(h or problem.h)
+    stats = search_stats(problem)
+    root = Node(problem.initial)
+    if problem.goal_test(root.state):
+        return root
+    beam, reached = [root], {root.state}  # states kept in some beam
+    while beam:
+        children = {}  # state -> cheapest child in this level
+        for node in beam:
+            if deadline is not None and time.perf_counter() > deadline:
+                return None
+            size = len(children)
+            for child in node.iter_expand(problem, reached):
+                if child.state not in children or child.path_cost < children[child.state].path_cost:
+                    children[child.state] = child
+            if stats is not None:
+                stats.expansion(len(children) - size, len(children))
+        goals = [child for child in children.values() if problem.goal_test(child.state)]
+        if goals:
+            return min(goals, key=lambda node: node.path_cost)
+        beam = heapq.nsmallest(beam_width, children.values(), key=lambda node: node.path_cost + h(node))
+        reached.update(node.state for node in beam)
+    return None
         
+# Run any search above on an InstrumentedProblem and return (result, SearchStats).
+# callback(stats) is called every `every` expansions and once at the end.
+def instrumented_search(search, problem, callback=None, every=1000, **kwargs):
+    stats = SearchStats(callback, every)
+    problem = InstrumentedProblem(problem, stats)
+    h = kwargs.get('h')
+    if isinstance(h, HeuristicCache):
+        h, inner = h.h, h  # time the heuristic behind the caller's cache, keeping the cache
+        inner.h = timed(h, stats, 'time_h')
+    elif h is not None:
+        kwargs['h'] = timed(h, stats, 'time_h')
+    start = time.perf_counter()
+    try:
+        result = search(problem, **kwargs)
+    finally:
+        if isinstance(kwargs.get('h'), HeuristicCache):
+            kwargs['h'].h = h
+    stats.wall_time = time.perf_counter() - start
+    if isinstance(result, Node):
+        stats.solution_depth = result.depth
+    if callback is not None:
+        callback(stats)
+    return result, stats
+
 # Depth-limited search 
-def depth_limited_search(problem, limit=50) -> Node:
-    def recursive_dls(node, problem, limit):
+# Explicit stack, so deep limits do not hit the recursion limit. The search starts from
+# the nodes in starts (default: the root); nodes cut off at the limit are collected
+# into frontier, up to max_frontier of them.
+def depth_limited_search(problem, limit=50, starts=None, frontier=None, max_frontier=np.inf) -> Node:
+    stats = search_stats(problem)
+    stack = list(reversed(starts)) if starts else [Node(problem.initial)]
+    cutoff_occurred = False
+    while stack:
+        node = stack.pop()
         if problem.goal_test(node.state):
-            return node 
-        elif limit == 0:
-            return 'cutoff'
-        else:
-            cutoff_ocurred = False 
-            for child in node.expand(problem):  # expand child nodes, even visited ones because there's no closed list
-                result = recursive_dls(child, problem, limit-1)
-                if result == 'cutoff':
-                    cutoff_ocurred = True 
-                elif result is not None:
-                    return result 
-                return 'cutoff' if cutoff_ocurred else None 
-
-    return recursive_dls(Node(problem.initial), problem, limit)
+            break
+        if node.depth >= limit:
+            cutoff_occurred = True
+            if frontier is not None and len(frontier) < max_frontier:
+                frontier.append(node)
+            continue
+        children = list(node.iter_expand(problem))  # expand child nodes, even visited ones because there's no closed list
+        stack.extend(reversed(children))
+        if stats is not None:
+            stats.expansion(len(children), len(stack))
+    else:
+        node = 'cutoff' if cutoff_occurred else None
+    return node
 
 # Iterative deepening search 
-def iterative_deepening_search(problem):
+# With reuse_frontier, the nodes cut off at one depth limit are kept and the next
+# iteration only searches one level below them (breadth-first by levels). Once the
+# kept frontier would exceed max_frontier nodes it is dropped and the remaining
+# iterations restart depth-first from the root. With an InstrumentedProblem,
+# stats.iterations records, per depth limit, the nodes generated and whether the
+# frontier was reused.
+def iterative_deepening_search(problem, reuse_frontier=False, max_frontier=100000):
+    stats = search_stats(problem)
+    starts = None
     for depth in range(sys.maxsize):  # avoid stack overflow 
-        result = depth_limited_search(problem, depth)
+        frontier = [] if reuse_frontier else None
+        generated = stats.generated if stats is not None else 0
+        result = depth_limited_search(problem, depth, starts, frontier, max_frontier)
+        if stats is not None:
+            stats.iterations.append({'limit': depth, 'generated': stats.generated - generated,
+                                     'reused': starts is not None})
         if result != 'cutoff':
             return result 
+        if reuse_frontier and len(frontier) < max_frontier:
+            starts = frontier
+        else:
+            starts, reuse_frontier = None, False  # out of memory: plain iterative deepening from now on
 
 # Bidirectional best-first search 
 # https://webdocs.cs.ualberta.ca/~holte/Publications/MM-AAAI2016.pdf -- BBFS whose forward and backward searches are guaranteed to meet in the middle 
 # Keep two open lists and two tables of reached states 
-def bidirectional_search(problem):
-    e = 0  # in graph problem, e is the min edge 
-    gF, gB = {Node(problem.initial): 0}, {Node(problem.goal): 0}
-    openF, openB = [Node(problem.initial)], [Node(problem.goal)] # open lists
-    closedF, closedB = [], []  # closed lists 
-    U = np.inf 
-
-    def extend(U, open_dir, open_other, g_dir, g_other, closed_dir):
-        n = find_key(C, open_dir, g_dir) # next node to extend 
-        
-        open_dir.remove(n)
-        closed_dir.append(n)
-
-        for c in n.expand(problem):
-            if c in open_dir or c in closed_dir:
-                if g_dir[c] <= problem.path_cost(g_dir[n], n.state, None, c.state):
-                    continue # not optimal
-                open_dir.remove(c) 
-
-            g_dir[c] = problem.path_cost(g_dir[n], n.state, None, c.state)  # update the cost function g(x)
-            open_dir.append(c) # add to open list 
-            # if c can be joined with the other direction, update the current optimal cost 
-            if c in open_other:
-                U = min(U, g_dir[c] + g_other[c])
-
-        return U, open_dir, closed_dir, g_dir 
-
-    def find_min(open_dir, g):
-        pr_min, pr_min_f = np.inf, np.inf 
-        for n in open_dir:
-            f = g[n] + problem.h(n)  # total_cost + heuristic, such as a-star
-            pr = max(f, 2 * g[n]) # novel way of ordering the open list, 2g(n)>f(n) iff g(n)>h(n) iff n far from start
-            pr_min = min(pr_min, pr)
-            pr_min_f = min(pr_min_f, f) 
-
-        return pr_min, pr_min_f, min(g.values()) 
-
-    def find_key(pr_min, open_dir, g):
-        """Finds key in open_dir with value equal to pr_min and minimum g value."""
-        m = np.inf 
-        node = Node(-1) 
-        for n in open_dir:
-            pr = max(g[n] + problem.h(n), 2 * g[n])
-            if pr == pr_min:
-                if g[n] < m:
-                    m = g[n]
-                    node = n 
+# Open lists are lazy heaps keyed by pr(n) = max(f(n), 2g(n)) (ties to lower g), with side
+# heaps on f and g for the stopping rule; g tables, closed sets and h values are hashed
+# by state. Actions are assumed reversible with symmetric costs. hF estimates the cost
+# to the goal, hB the cost to the initial state (0 by default). e is the min edge cost.
+class MMDirection:
+    """One side of bidirectional_search: open list, g table and cached h."""
+    def __init__(self, starts, h):
+        self.h, self.h_cache = h, {}
+        self.reached = {start: Node(start) for start in starts}  # best node (and so g) per state, open or closed
+        self.open = set(self.reached)
+        self.heaps = ([], [], [])  # keyed by (pr, g), f and g
+        self.counter = itertools.count()  # tie-breaker
+        for node in self.reached.values():
+            self.push(node)
 
-        return node 
+    def heuristic(self, node):
+        if node.state not in self.h_cache:
+            self.h_cache[node.state] = self.h(node)
+        return self.h_cache[node.state]
+
+    def push(self, node):
+        g = node.path_cost
+        f = g + self.heuristic(node)
+        pr = max(f, 2 * g)  # 2g(n)>f(n) iff g(n)>h(n) iff n far from start
+        for heap, key in zip(self.heaps, ((pr, g), f, g)):
+            heapq.heappush(heap, (key, g, next(self.counter), node.state))
+
+    def top(self, i):
+        heap = self.heaps[i]
+        while heap and not (heap[0][-1] in self.open and self.reached[heap[0][-1]].path_cost == heap[0][1]):
+            heapq.heappop(heap)  # stale entry
+        return heap[0]
 
-    while openF and openB:
-        pr_min_f, f_min_f, g_min_f = find_min(openF, gF) 
-        pr_min_b, f_min_b, g_min_b = find_min(openB, gB) 
+def bidirectional_search(problem, hF=None, hB=None, e=0) -> Node:
+    hF = hF or problem.h
+    hB = hB or (lambda node: 0)
+    instrumented = search_stats(problem)
+
+    # several goals (a GoalSet of states) all start the backward search
+    forward, backward = MMDirection([problem.initial], hF), MMDirection(problem.goal_states(), hB)
+    U, meet = np.inf, None
+    if problem.goal_test(problem.initial):
+        U, meet = 0, problem.initial
+
+    def extend(d, other):
+        nonlocal U, meet
+        state = d.top(0)[-1]  # node with pr == C and minimum g
+        d.open.discard(state)
+        n = d.reached[state]
+        added = 0
+        for c in n.iter_expand(problem):
+            if c.state in d.reached and d.reached[c.state].path_cost <= c.path_cost:
+                continue  # not optimal
+            d.reached[c.state] = c  # update the cost function g(x)
+            d.open.add(c.state)  # add (or reopen) to open list
+            d.push(c)
+            added += 1
+            # if c can be joined with the other direction, update the current optimal cost
+            if c.state in other.reached and c.path_cost + other.reached[c.state].path_cost < U:
+                U, meet = c.path_cost + other.reached[c.state].path_cost, c.state
+        if instrumented is not None:
+            instrumented.expansion(added, len(forward.open) + len(backward.open))
+
+    while forward.open and backward.open:
+        pr_min_f, pr_min_b = forward.top(0)[0][0], backward.top(0)[0][0]
         C = min(pr_min_f, pr_min_b)
         # terminating condition
-        if U <= max(C, f_min_f, f_min_b, g_min_f + g_min_b + e):
-            return U
-
+        if U <= max(C, forward.top(1)[0], backward.top(1)[0], forward.top(2)[0] + backward.top(2)[0] + e):
+            break
         if C == pr_min_f:
-            # extend forward 
-            U, openF, closedF, gF = extend(U, openF, openB, gF, gB, closedF) 
+            extend(forward, backward)
         else:
-            # extend backward 
-            U, openB, closedB, gB = extend(U, openB, openF, gB, gF, closedB)
+            extend(backward, forward)
 
-    return np.inf
+    if meet is None:
+        return None
+    # join the two half paths: walk the backward half, replaying each step forward
+    node, back = forward.reached[meet], backward.reached[meet].parent
+    while back is not None:
+        action = next(a for a in problem.actions(node.state) if problem.result(node.state, a) == back.state)
+        node, back = node.child_node(problem, action), back.parent
+    return node
 
 # Simplified memory bounded A* search
-# TODO
+# At most max_nodes nodes (or max_bytes, with the bytes per node estimated by
+# sma_node_bytes) are kept in memory. When full, the shallowest leaf with the highest f is forgotten and its f is
+# backed up into its parent, which is regenerated later if it becomes the best again.
+# Successors are generated one at a time; a node is (re-)expanded when it gets a child
+# while it has none in memory. Peak memory, evictions and re-generations go to the
+# SearchStats of an InstrumentedProblem.
+class SMARecord:
+    """Bookkeeping of a node kept in memory by sma_star_search."""
+    __slots__ = ('node', 'parent', 'actions', 'children', 'generated', 'forgotten',
+                 'in_open', 'version')
+
+    def __init__(self, node, parent, actions=None):
+        self.node = node
+        self.parent = parent  # SMARecord of the parent
+        self.actions = actions  # computed when the node is first picked
+        self.children = {}  # action -> SMARecord of children in memory
+        self.generated = set()  # actions generated at least once
+        self.forgotten = {}  # action -> backed up f of forgotten children
+        self.in_open = False
+        self.version = 0
+
+# Bytes taken by one node kept by sma_star_search, estimated on root: the Node, its
+# state and f, its SMARecord with full containers, and up to two entries (a live and a
+# stale one, see the compaction in push) in each of the two heaps, where a stale entry
+# may keep the emptied SMARecord of an evicted node alive.
+def sma_node_bytes(root_rec):
+    size = sys.getsizeof
+    root, actions = root_rec.node, root_rec.actions
+    rec = SMARecord(root, None, list(actions))
+    rec.children, rec.generated, rec.forgotten = dict.fromkeys(actions), set(actions), dict.fromkeys(actions, 0.0)
+    entry = (0.5, -1, 2 ** 40, 1, rec)
+    entry_bytes = size(entry) + size(entry[0]) + size(entry[2]) + 8  # tuple, f, counter, slot in the heap list
+    stale_bytes = entry_bytes + size(rec)
+    return (size(root) + size(root.state) + size(0.5) + size(rec) + size(rec.actions) + size(rec.children) +
+            size(rec.generated) + size(rec.forgotten) + 2 * (entry_bytes + stale_bytes))
+
+def sma_star_search(problem, max_nodes=None, h=None, max_bytes=None) -> Node:
+    if max_nodes is None and max_bytes is None:
+        raise ValueError("sma_star_search needs max_nodes or max_bytes.")
+    h = memoize_node_heuristic(h or problem.h)
+    root = Node(problem.initial)
+    root.f = h(root)
+    root_rec = SMARecord(root, None, list(problem.actions(root.state)))
+    node_bytes = sma_node_bytes(root_rec)
+    if max_bytes is not None:
+        max_nodes = min(max_nodes or np.inf, max_bytes // node_bytes)
+    if max_nodes < 2:
+        raise ValueError("sma_star_search needs room for at least 2 nodes.")
+    stats = search_stats(problem)
+    counter = itertools.count()
+    best, worst = [], []  # open list as two lazy heaps: lowest f deepest, highest f shallowest
+
+    def push(rec):
+        if max(len(best), len(worst)) >= 2 * max_nodes:  # drop stale entries: at most one per live one
+            best[:] = [e for e in best if valid(e)]
+            worst[:] = [e for e in worst if valid(e)]
+            heapq.heapify(best)
+            heapq.heapify(worst)
+        rec.in_open = True
+        rec.version += 1
+        node = rec.node
+        heapq.heappush(best, (node.f, -node.depth, next(counter), rec.version, rec))
+        heapq.heappush(worst, (-node.f, node.depth, next(counter), rec.version, rec))
+
+    def valid(entry):
+        return entry[-1].in_open and entry[-2] == entry[-1].version
+
+    def backup(rec):
+        # f of a fully generated node is the lowest f among its children, remembered or forgotten
+        while rec is not None and len(rec.generated) == len(rec.actions):
+            new_f = min([c.node.f for c in rec.children.values()] + list(rec.forgotten.values()), default=np.inf)
+            if new_f == rec.node.f:
+                break
+            rec.node.f = new_f
+            if rec.in_open:
+                push(rec)
+            rec = rec.parent
+
+    def evict():
+        while worst:
+            entry = heapq.heappop(worst)
+            rec = entry[-1]
+            if valid(entry) and not rec.children and rec.parent is not None:
+                break
+        else:
+            return False
+        rec.in_open = False
+        parent = rec.parent
+        del parent.children[rec.node.action]
+        parent.forgotten[rec.node.action] = rec.node.f
+        # stale heap entries still point to rec until the next compaction: keep it empty
+        rec.node = rec.parent = rec.actions = rec.children = rec.generated = rec.forgotten = None
+        push(parent)  # back in open, and in the worst heap again if it became a leaf
+        return True
+
+    used = peak_nodes = 1
+    regenerated = re_expanded = evicted = max_depth = 0
+    push(root_rec)
+    try:
+        while True:
+            while best and not valid(best[0]):
+                heapq.heappop(best)
+            if not best or best[0][-1].node.f == np.inf:
+                return None  # no solution reachable within the memory bound
+            rec = best[0][-1]
+            node = rec.node
+            if problem.goal_test(node.state):
+                return node
+            if rec.actions is None:
+                rec.actions = list(problem.actions(node.state))
+                if not rec.actions:  # dead end: its f becomes infinite
+                    backup(rec)
+                    continue
+            # new successors first, then the most promising forgotten one
+            action = next((a for a in rec.actions if a not in rec.generated), None)
+            if action is None:
+                action = min(rec.forgotten, key=rec.forgotten.get)
+            child = node.child_node(problem, action)
+            if node.parent is not None and child.state == node.parent.state:
+                rec.actions.remove(action)  # never walk back to the parent
+                if rec.actions and len(rec.children) == len(rec.actions):
+                    rec.in_open = False
+                backup(rec)
+                continue
+            backed_up_f = rec.forgotten.pop(action, 0)
+            if action in rec.generated:
+                regenerated += 1
+            child_rec = SMARecord(child, rec)
+            if not problem.goal_test(child.state) and child.depth >= max_nodes - 1:
+                child.f = np.inf  # no room on the path to go deeper
+            else:
+                child.f = max(node.f, backed_up_f, child.path_cost + h(child))
+            max_depth = max(max_depth, child.depth)
+            expanding = not rec.children
+            if expanding and rec.generated:
+                re_expanded += 1
+                if stats is not None:
+                    stats.expanded += 1  # the actions were kept, so InstrumentedProblem did not count it
+            rec.children[action] = child_rec
+            rec.generated.add(action)
+            backup(rec)
+            if len(rec.children) == len(rec.actions):
+                rec.in_open = False  # all successors in memory
+            used += 1
+            push(child_rec)
+            while used > max_nodes and evict():
+                used -= 1
+                evicted += 1
+            peak_nodes = max(peak_nodes, used)
+            if stats is not None:
+                if expanding:
+                    stats.expansion(1, used)
+                else:  # one more child of the node being expanded
+                    stats.added += 1
+                    stats.peak_frontier = max(stats.peak_frontier, used)
+    finally:
+        if stats is not None:
+            stats.regenerated += regenerated
+            stats.re_expanded += re_expanded
+            stats.evicted += evicted
+            stats.max_depth = max(stats.max_depth, max_depth)
+            stats.peak_nodes = max(stats.peak_nodes, peak_nodes)
+            stats.peak_bytes = max(stats.peak_bytes, peak_nodes * node_bytes)
+
+# Hash-distributed A* (HDA*) on a process pool
+# Worker i owns the states with hash(state) % workers == i and runs A* on them; generated
+# successors are sent to their owner in batches. The cost U of the best goal found is
+# shared, and the search stops once every worker is idle (open list empty or f >= U) and
+# every sent batch has been received. Each worker then returns its parent pointers so
+# the optimal path can be rebuilt as a Node. Uses the fork start method.
+# Worker owning state: hash(state) mixed by the splitmix64 finalizer, so every bit of the
+# hash counts (hash of a packed SlidingTilePuzzle int is the int itself, whose low bits
+# only hold the tile in cell 0)
+MASK64 = (1 << 64) - 1
+
+def hda_owner(state, workers):
+    z = hash(state) & MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return (z ^ (z >> 31)) % workers
+
+# Share of the states owned by each of the workers; raises ValueError if the largest
+# share exceeds tolerance times the mean, which would cap the speedup of HDA*
+def check_partition_balance(states, workers, tolerance=1.25):
+    counts = np.bincount([hda_owner(s, workers) for s in states], minlength=workers)
+    if counts.max() > tolerance * counts.mean():
+        raise ValueError(f"Unbalanced partition of {len(states)} states over {workers} workers: {counts.tolist()}")
+    return counts / counts.sum()
+
+def hda_star_worker(i, problem, h, inboxes, results, shared, batch_size):
+    workers = len(inboxes)
+    lock, U, idle, sent, received, stop = shared
+    reached = {}  # state -> (g, parent state, action)
+    frontier = []
+    counter = itertools.count()
+    outboxes = [[] for _ in range(workers)]
+    best_goal = None
+
+    def add(state, g, parent, action):
+        if state in reached and reached[state][0] <= g:
+            return
+        reached[state] = (g, parent, action)
+        f = g + h(Node(state, path_cost=g))
+        if f < U.value:
+            heapq.heappush(frontier, (f, g, next(counter), state))
+
+    def flush(force=False):
+        for j, batch in enumerate(outboxes):
+            if batch and (force or len(batch) >= batch_size):
+                with lock:
+                    sent.value += 1
+                inboxes[j].put(batch)
+                outboxes[j] = []
+
+    while not stop.is_set():
+        while True:  # drain incoming batches
+            try:
+                batch = inboxes[i].get_nowait()
+            except queue.Empty:
+                break
+            with lock:
+                idle[i] = 0
+                received.value += 1
+            for entry in batch:
+                add(*entry)
+        if frontier and frontier[0][0] < U.value:
+            f, g, _, state = heapq.heappop(frontier)
+            if reached[state][0] != g:
+                continue  # stale entry
+            if problem.goal_test(state):
+                with lock:
+                    if g < U.value:
+                        U.value = g
+                        best_goal = (state, g)
+                continue
+            for action in problem.actions(state):
+                child = problem.result(state, action)
+                entry = (child, problem.path_cost(g, state, action, child), state, action)
+                j = hda_owner(child, workers)
+                if j == i:
+                    add(*entry)
+                else:
+                    outboxes[j].append(entry)
+            flush()
+        else:
+            flush(force=True)
+            with lock:
+                idle[i] = 1
+            try:  # wait for work
+                batch = inboxes[i].get(timeout=0.01)
+            except queue.Empty:
+                continue
+            with lock:
+                idle[i] = 0
+                received.value += 1
+            for entry in batch:
+                add(*entry)
+    results.put((reached, best_goal))
+
+def parallel_astar_search(problem, h=None, workers=4, batch_size=64) -> Node:
+    h = h or problem.h
+    ctx = multiprocessing.get_context('fork')
+    inboxes = [ctx.Queue() for _ in range(workers)]
+    results = ctx.Queue()
+    lock = ctx.Lock()
+    shared = (lock, ctx.Value('d', np.inf, lock=False), ctx.Array('b', workers, lock=False),
+              ctx.Value('q', 1, lock=False), ctx.Value('q', 0, lock=False), ctx.Event())
+    _, U, idle, sent, received, stop = shared
+    inboxes[hda_owner(problem.initial, workers)].put([(problem.initial, 0, None, None)])
+    processes = [ctx.Process(target=hda_star_worker, args=(i, problem, h, inboxes, results, shared, batch_size))
+                 for i in range(workers)]
+    for p in processes:
+        p.start()
+    while True:  # termination detection
+        time.sleep(0.001)
+        with lock:
+            if all(idle) and sent.value == received.value:
+                break
+        if any(p.exitcode is not None for p in processes):  # a worker died: it never becomes idle
+            stop.set()
+            codes = [p.exitcode for p in processes]
+            for p in processes:
+                p.terminate()
+                p.join()
+            raise RuntimeError(f"parallel_astar_search worker exited early (exit codes {codes}).")
+    stop.set()
+    reached, goal = {}, None
+    for table, best_goal in gather_results(results, processes, workers):
+        reached.update(table)
+        if best_goal is not None and (goal is None or best_goal[1] < goal[1]):
+            goal = best_goal
+    for p in processes:
+        p.join()
+    if goal is None:
+        return None
+    # rebuild the path from the parent pointers of all workers
+    actions, state = [], goal[0]
+    while reached[state][1] is not None:
+        _, state, action = reached[state]
+        actions.append(action)
+    node = Node(problem.initial)
+    for action in reversed(actions):
+        node = node.child_node(problem, action)
+    return node
+
+# Batch solving of many independent problems on a process pool
+class SearchBudgetExceeded(Exception):
+    pass
+
+class BudgetedProblem(ProblemWrapper):
+    """Wraps a problem and raises SearchBudgetExceeded once max_nodes nodes have been
+    expanded (calls to actions) or timeout seconds have passed since it was made."""
+    def __init__(self, problem, max_nodes=None, timeout=None):
+        super().__init__(problem)
+        self.max_nodes = max_nodes
+        self.deadline = time.perf_counter() + timeout if timeout is not None else None
+        self.expanded = 0
+
+    def actions(self, state):
+        self.expanded += 1
+        if self.max_nodes is not None and self.expanded > self.max_nodes:
+            raise SearchBudgetExceeded('node_limit')
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchBudgetExceeded('timeout')
+        return self.problem.actions(state)
+
+class ProblemSpec:
+    """Cheap, picklable description of a problem: factory(*args) is called in the
+    worker, so heavy problem objects (move tables, heuristics) never cross processes.
+    timeout and max_nodes, when given, override the defaults of solve_batch for this query."""
+    def __init__(self, factory, *args, timeout=None, max_nodes=None):
+        self.factory = factory
+        self.args = args
+        self.budget = {k: v for k, v in (('timeout', timeout), ('max_nodes', max_nodes)) if v is not None}
+
+    def build(self):
+        return self.factory(*self.args)
+
+# What solve_batch returns for a solved query: the goal Node is not sent back, as
+# pickling its parent chain recurses once per step and fails on long solutions.
+Solution = namedtuple('Solution', ['actions', 'states', 'cost'])
+
+def node_solution(node):
+    path = node.solution()
+    return Solution([n.action for n in path[1:]], [n.state for n in path], node.path_cost)
+
+batch_config = {}  # set once per worker process by solve_batch
+
+def batch_worker_init(search, search_kwargs, timeout, max_nodes):
+    batch_config.update(search=search, search_kwargs=search_kwargs, timeout=timeout, max_nodes=max_nodes)
+
+def batch_worker_solve(task):
+    index, item = task
+    spec, budget = item if isinstance(item, tuple) else (item, {})
+    if isinstance(spec, ProblemSpec):
+        problem, budget = spec.build(), {**spec.budget, **budget}
+    else:
+        problem = spec
+    timeout = budget.get('timeout', batch_config['timeout'])
+    start = time.perf_counter()
+    problem = BudgetedProblem(problem, budget.get('max_nodes', batch_config['max_nodes']), timeout)
+    try:
+        result = batch_config['search'](problem, **batch_config['search_kwargs'])
+        status = 'failure' if result is None or isinstance(result, str) else 'solved'
+    except SearchBudgetExceeded as exc:
+        result, status = None, exc.args[0]
+    result = node_solution(result) if status == 'solved' else None
+    info = {'status': status, 'expanded': problem.expanded, 'seconds': time.perf_counter() - start}
+    return index, result, info
+
+# Yields (index, result, info) as queries complete; result is a Solution (actions, states,
+# cost) or None and info has status ('solved', 'failure', 'timeout' or 'node_limit'),
+# expanded and seconds. timeout (seconds) and max_nodes are per query defaults. Each item
+# of problems is a Problem, a ProblemSpec, or a (Problem or ProblemSpec, budget) pair where
+# budget is a dict that may override timeout and max_nodes for that query.
+def solve_batch(problems, search=None, workers=None, chunksize=16, timeout=None, max_nodes=None, **search_kwargs):
+    search = search or astar_search
+    ctx = multiprocessing.get_context('fork')
+    with ctx.Pool(workers, batch_worker_init, (search, search_kwargs, timeout, max_nodes)) as pool:
+        for index, result, info in pool.imap_unordered(batch_worker_solve, enumerate(problems), chunksize):
+            yield index, result, info
 
 # Example problem 
 class EightPuzzle(Problem):
@@ -294,3 +911,353 @@ class EightPuzzle(Problem):
     # number of misplaced tiles, heuristic 
     def h(self, node):
         return sum(s != g for (s, g) in zip(node.state, self.goal))
+
+
+# Generalized N x N sliding-tile puzzle with packed-integer states.
+# Cell i holds its tile in bits [i*bits, (i+1)*bits) of a single int (4-bit nibbles
+# for the 8- and 15-puzzle, so a 15-puzzle state fits in 64 bits). Moves are read
+# from tables precomputed for each blank position.
+class SlidingTilePuzzle(Problem):
+    directions = ('UP', 'DOWN', 'LEFT', 'RIGHT')
+
+    def __init__(self, initial, n=3, goal=None):
+        self.n = n
+        self.size = n * n
+        self.bits = max(4, (self.size - 1).bit_length())
+        self.mask = (1 << self.bits) - 1
+        self.low = sum(1 << (self.bits * i) for i in range(self.size))  # lowest bit of each cell
+        goal = goal if goal is not None else tuple(range(1, self.size)) + (0,)
+        if initial is not None and not isinstance(initial, int):
+            initial = self.encode(initial)
+        # as for Problem, a list or set holds several goals; a single goal is an encoded
+        # state or a tuple of tiles
+        if isinstance(goal, (list, set, frozenset)):
+            goal = {self.encode_goal(g) for g in goal}
+        else:
+            goal = self.encode_goal(goal)
+        super().__init__(initial, goal)
+        # move tables: blank position -> (action, cell the blank moves to)
+        delta = {'UP': -n, 'DOWN': n, 'LEFT': -1, 'RIGHT': 1}
+        self.moves = []
+        for b in range(self.size):
+            row, col = divmod(b, n)
+            legal = {'UP': row > 0, 'DOWN': row < n - 1, 'LEFT': col > 0, 'RIGHT': col < n - 1}
+            self.moves.append(tuple((a, b + delta[a]) for a in self.directions if legal[a]))
+        self.action_tuples = [tuple(a for a, _ in m) for m in self.moves]
+        self.targets = [dict(m) for m in self.moves]
+
+    def encode(self, tiles) -> int:
+        state = 0
+        for i, t in enumerate(tiles):
+            state |= t << (self.bits * i)
+        return state
+
+    def encode_goal(self, goal) -> int:
+        if isinstance(goal, tuple) and len(goal) == self.size:
+            goal = self.encode(goal)
+        if isinstance(goal, int) and sorted(self.decode(goal)) == list(range(self.size)) and goal >> (self.bits * self.size) == 0:
+            return goal
+        raise ValueError(f"A goal must be an encoded state or a tuple of the {self.size} tiles, not {goal!r} "
+                         "(several goals are given as a list or set of them).")
+
+    def decode(self, state) -> tuple:
+        return tuple((state >> (self.bits * i)) & self.mask for i in range(self.size))
+
+    def find_blank_square(self, state):
+        # fold every cell onto its lowest bit; the blank is the only cell left at 0
+        folded = state
+        for k in range(1, self.bits):
+            folded |= state >> k
+        blank_bit = self.low & ~folded
+        return (blank_bit.bit_length() - 1) // self.bits
+
+    def actions(self, state):
+        return self.action_tuples[self.find_blank_square(state)]
+
+    def result(self, state, action):
+        blank = self.find_blank_square(state)
+        target = self.targets[blank][action]
+        tile = (state >> (self.bits * target)) & self.mask
+        return state - (tile << (self.bits * target)) + (tile << (self.bits * blank))
+
+    def check_solvability(self, state):
+        tiles = list(self.decode(state) if isinstance(state, int) else state)
+        inversion = 0
+        for i in range(len(tiles)):
+            for j in range(i+1, len(tiles)):
+                if (tiles[i]>tiles[j]) and tiles[i]!=0 and tiles[j]!=0:
+                    inversion += 1
+        if self.n % 2 == 1:
+            return inversion % 2 == 0
+        blank_row_from_bottom = self.n - tiles.index(0) // self.n
+        return (inversion + blank_row_from_bottom) % 2 == 1
+
+    # number of misplaced tiles (fewest over the goals), heuristic
+    def h(self, node):
+        if self.goals is None:
+            return self.misplaced(node.state, self.goal)
+        return min(self.misplaced(node.state, goal) for goal in self.goal_states())
+
+    def misplaced(self, state, goal):
+        diff = state ^ goal
+        folded = diff
+        for k in range(1, self.bits):
+            folded |= diff >> k
+        return bin(folded & self.low).count('1')
+
+    def expand_batch(self, states):
+        """Generate the successors of a whole frontier batch with NumPy.
+        states: uint64 array of packed states (requires n*n*bits <= 64).
+        Returns (children, parent_index, action_index into self.directions)."""
+        if self.size * self.bits > 64:
+            raise ValueError("expand_batch needs states that fit in 64 bits.")
+        states = np.asarray(states, dtype=np.uint64)
+        bits = np.uint64(self.bits)
+        folded = states.copy()
+        for k in range(1, self.bits):
+            folded |= states >> np.uint64(k)
+        blank_bits = np.uint64(self.low) & ~folded
+        blank = np.zeros(len(states), dtype=np.int64)
+        for i in range(self.size):
+            blank[(blank_bits >> np.uint64(self.bits * i)) & np.uint64(1) == 1] = i
+        children, parents, actions = [], [], []
+        for d, a in enumerate(self.directions):
+            target_table = np.array([self.targets[b].get(a, -1) for b in range(self.size)])
+            target = target_table[blank]
+            idx = np.nonzero(target >= 0)[0]
+            s, b, t = states[idx], blank[idx].astype(np.uint64), target[idx].astype(np.uint64)
+            tile = (s >> (bits * t)) & np.uint64(self.mask)
+            children.append(s - (tile << (bits * t)) + (tile << (bits * b)))
+            parents.append(idx)
+            actions.append(np.full(len(idx), d))
+        return np.concatenate(children), np.concatenate(parents), np.concatenate(actions)
+
+
+# Example problem: route finding on an explicit graph
+class CSRGraph:
+    """Directed weighted graph in compressed sparse row form. Vertices are 0..n-1;
+    the edges out of v go to indices[indptr[v]:indptr[v+1]] (sorted) with the
+    matching weights. coords (n x 2), if given, allow the straight-line heuristic."""
+
+    files = ('indptr', 'indices', 'weights', 'coords')
+
+    def __init__(self, indptr, indices, weights, coords=None):
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.coords = coords
+        self.reversed = None
+
+    @property
+    def n(self):
+        return len(self.indptr) - 1
+
+    @classmethod
+    def from_edges(cls, edges, n=None, undirected=False, coords=None):
+        """edges: (u, v, weight) triples, or an (m x 3) array. Of parallel edges only
+        the cheapest is kept."""
+        edges = np.asarray(list(edges) if not isinstance(edges, np.ndarray) else edges, dtype=np.float64).reshape(-1, 3)
+        u, v, w = edges[:, 0].astype(np.int64), edges[:, 1].astype(np.int64), edges[:, 2]
+        if undirected:
+            u, v, w = np.concatenate([u, v]), np.concatenate([v, u]), np.concatenate([w, w])
+        n = n if n is not None else int(max(u.max(), v.max())) + 1 if len(u) else 0
+        order = np.lexsort((w, v, u))
+        u, v, w = u[order], v[order], w[order]
+        first = np.ones(len(u), dtype=bool)
+        first[1:] = (u[1:] != u[:-1]) | (v[1:] != v[:-1])
+        u, v, w = u[first], v[first], w[first]
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(u, minlength=n), out=indptr[1:])
+        return cls(indptr, v, w, None if coords is None else np.asarray(coords, dtype=np.float64))
+
+    @classmethod
+    def from_edge_list(cls, path, n=None, undirected=False):
+        """Text file with one 'u v weight' line per edge."""
+        return cls.from_edges(np.loadtxt(path, ndmin=2), n, undirected)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in self.files:
+            if getattr(self, name) is not None:
+                np.save(os.path.join(directory, name + '.npy'), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        arrays = {}
+        for name in cls.files:
+            path = os.path.join(directory, name + '.npy')
+            if os.path.exists(path):
+                arrays[name] = np.load(path, mmap_mode='r' if mmap else None)
+        return cls(**arrays)
+
+    def reverse(self):
+        """The graph with every edge reversed (built once), for backward searches."""
+        if self.reversed is None:
+            u = np.repeat(np.arange(self.n), np.diff(self.indptr))
+            edges = np.column_stack([self.indices, u, self.weights])
+            self.reversed = CSRGraph.from_edges(edges, self.n, coords=self.coords)
+            self.reversed.reversed = self
+        return self.reversed
+
+    def weight(self, u, v):
+        start, end = self.indptr[u], self.indptr[u + 1]
+        return self.weights[start + np.searchsorted(self.indices[start:end], v)]
+
+
+class GraphProblem(Problem):
+    """Find a cheapest route between vertices of a CSRGraph. An action is the vertex
+    moved to. goal is a vertex, or a list or set of vertices (any of them)."""
+
+    def __init__(self, initial, goal, graph):
+        super().__init__(initial, goal)
+        self.graph = graph
+        self.goal_vertices = np.array(sorted(self.goal_states()), dtype=np.int64)
+
+    def actions(self, state):
+        return self.graph.indices[self.graph.indptr[state]:self.graph.indptr[state + 1]].tolist()
+
+    def result(self, state, action):
+        return action
+
+    def path_cost(self, c, state1, action, state2):
+        return c + float(self.graph.weight(state1, state2))
+
+    def h(self, node):
+        return float(self.h_vector(np.array([node.state]))[0])
+
+    def h_vector(self, vertices):
+        """Straight-line distance to the nearest goal for an array of vertices
+        (0 without coords, which turns A* into Dijkstra)."""
+        if self.graph.coords is None:
+            return np.zeros(len(vertices))
+        diff = self.graph.coords[vertices][:, None, :] - self.graph.coords[self.goal_vertices][None, :, :]
+        return np.sqrt((diff ** 2).sum(axis=2)).min(axis=1)
+
+# Turn a vertex path into the chain of Nodes the other searches return
+def graph_path_node(problem, path, dist):
+    node = Node(path[0], path_cost=float(dist[path[0]]))
+    for v in path[1:]:
+        node = Node(v, node, v, float(dist[v]))
+    return node
+
+def graph_path(parent, v):
+    path = [v]
+    while parent[v] >= 0:
+        v = int(parent[v])
+        path.append(v)
+    return path[::-1]
+
+# A* on a GraphProblem over integer vertex ids
+# g and parents are NumPy arrays indexed by vertex and each expansion relaxes all the
+# out-edges of the vertex at once; no Node is created during the search. h maps an
+# array of vertices to an array of estimates (default problem.h_vector). Returns the
+# goal Node of the path, or (cost, vertices) with as_node=False.
+def graph_astar_search(problem, h=None, as_node=True):
+    graph = problem.graph
+    h = h or problem.h_vector
+    instrumented = search_stats(problem)
+    indptr, indices, weights = graph.indptr, graph.indices, graph.weights
+    dist = np.full(graph.n, np.inf)
+    parent = np.full(graph.n, -1, dtype=np.int64)
+    is_goal = np.zeros(graph.n, dtype=bool)
+    is_goal[problem.goal_vertices] = True
+    start = problem.initial
+    dist[start] = 0.0
+    heap = [(float(h(np.array([start]))[0]), 0.0, start)]
+    while heap:
+        _, g, v = heapq.heappop(heap)
+        if g > dist[v]:
+            continue  # stale entry
+        if is_goal[v]:
+            path = graph_path(parent, v)
+            return graph_path_node(problem, path, dist) if as_node else (g, path)
+        lo, hi = indptr[v], indptr[v + 1]
+        targets = indices[lo:hi]
+        g_new = g + weights[lo:hi]
+        better = g_new < dist[targets]
+        targets, g_new = targets[better], g_new[better]
+        dist[targets] = g_new
+        parent[targets] = v
+        for item in zip((g_new + h(targets)).tolist(), g_new.tolist(), targets.tolist()):
+            heapq.heappush(heap, item)
+        if instrumented is not None:  # actions and result are bypassed
+            instrumented.expanded += 1
+            instrumented.generated += hi - lo
+            instrumented.expansion(len(targets), len(heap))
+    return None if as_node else (np.inf, None)
+
+def graph_dijkstra_search(problem, as_node=True):
+    return graph_astar_search(problem, lambda vertices: np.zeros(len(vertices)), as_node)
+
+# Single-source (or multi-source) Dijkstra over the whole graph: distance array, inf
+# for the vertices that cannot be reached
+def graph_distances(graph, sources):
+    dist = np.full(graph.n, np.inf)
+    dist[sources] = 0.0
+    heap = [(0.0, v) for v in np.atleast_1d(sources).tolist()]
+    indptr, indices, weights = graph.indptr, graph.indices, graph.weights
+    while heap:
+        d, v = heapq.heappop(heap)
+        if d > dist[v]:
+            continue  # stale entry
+        lo, hi = indptr[v], indptr[v + 1]
+        targets = indices[lo:hi]
+        d_new = d + weights[lo:hi]
+        better = d_new < dist[targets]
+        targets, d_new = targets[better], d_new[better]
+        dist[targets] = d_new
+        for item in zip(d_new.tolist(), targets.tolist()):
+            heapq.heappush(heap, item)
+    return dist
+
+# Bidirectional Dijkstra on a GraphProblem
+# Alternates a forward search from the initial vertex and a backward search (on the
+# reversed graph) from all the goals, expanding the side with the smaller top key, and
+# stops once the two top keys add up to at least the best meeting cost mu.
+def graph_bidirectional_search(problem, as_node=True):
+    graph = problem.graph
+    instrumented = search_stats(problem)
+    sides = []
+    for g, starts in ((graph, [problem.initial]), (graph.reverse(), problem.goal_vertices.tolist())):
+        dist = np.full(graph.n, np.inf)
+        dist[starts] = 0.0
+        sides.append((g, dist, np.full(graph.n, -1, dtype=np.int64), [(0.0, v) for v in starts]))
+    mu, meet = np.inf, None
+    while sides[0][3] and sides[1][3]:
+        if sides[0][3][0][0] + sides[1][3][0][0] >= mu:
+            break
+        i = 0 if sides[0][3][0][0] <= sides[1][3][0][0] else 1
+        g, dist, parent, heap = sides[i]
+        other_dist = sides[1 - i][1]
+        d, v = heapq.heappop(heap)
+        if d > dist[v]:
+            continue  # stale entry
+        lo, hi = g.indptr[v], g.indptr[v + 1]
+        targets = g.indices[lo:hi]
+        d_new = d + g.weights[lo:hi]
+        better = d_new < dist[targets]
+        targets, d_new = targets[better], d_new[better]
+        dist[targets] = d_new
+        parent[targets] = v
+        for item in zip(d_new.tolist(), targets.tolist()):
+            heapq.heappush(heap, item)
+        through = d_new + other_dist[targets]
+        if len(through) and through.min() < mu:
+            k = int(through.argmin())
+            mu, meet = float(through[k]), int(targets[k])
+        if d + other_dist[v] < mu:
+            mu, meet = d + other_dist[v], v
+        if instrumented is not None:  # actions and result are bypassed
+            instrumented.expanded += 1
+            instrumented.generated += hi - lo
+            instrumented.expansion(len(targets), len(sides[0][3]) + len(sides[1][3]))
+    if meet is None:
+        return None if as_node else (np.inf, None)
+    forward, backward = sides[0][2], sides[1][2]
+    path = graph_path(forward, meet) + graph_path(backward, meet)[::-1][1:]
+    if not as_node:
+        return float(mu), path
+    dist = {path[0]: 0.0}
+    for u, v in zip(path, path[1:]):
+        dist[v] = dist[u] + float(graph.weight(u, v))
+    return graph_path_node(problem, path, dist)
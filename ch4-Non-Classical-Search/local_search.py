@@ -1,16 +1,50 @@
 from utils import *
 import numpy as np 
 import random
+import sys
+import time
+import queue
+import collections
+import collections.abc
+import multiprocessing
+
+# Local search uses the optional problem.delta_value(state, action), the value of the
+# neighbor minus the value of state, when the problem has one: then only the chosen
+# neighbor is built and no neighbor is evaluated from scratch.
+
+# Best neighbor of node (ties broken at random) and its value minus the value of node;
+# (None, None) if node has no neighbors. The neighbors are streamed, keeping a running
+# max and one of the tied ones by reservoir sampling, so none of them is stored.
+def best_neighbor(problem, node):
+    delta_value = getattr(problem, 'delta_value', None)
+    best = chosen = None
+    ties = 0
+    if delta_value is not None:
+        for a in problem.actions(node.state):
+            d = delta_value(node.state, a)
+            if best is None or d > best:
+                best, chosen, ties = d, a, 1
+            elif d == best:
+                ties += 1
+                if random.randrange(ties) == 0:
+                    chosen = a
+        return (None, None) if chosen is None else (node.child_node(problem, chosen), best)
+    for n in node.iter_expand(problem):
+        v = problem.value(n.state)
+        if best is None or v > best:
+            best, chosen, ties = v, n, 1
+        elif v == best:
+            ties += 1
+            if random.randrange(ties) == 0:
+                chosen = n
+    return (None, None) if chosen is None else (chosen, best - problem.value(node.state))
 
 # Steepest ascent hill climbing
 def hill_climbing(problem, initial=None):
     current = Node(initial if initial is not None else problem.initial)
     while True:
-        neighbors = current.expand(problem)
-        if not neighbors:
-            break
-        neighbor = argmax_random_tie(neighbors, key=lambda node: problem.value(node.state))
-        if problem.value(neighbor.state) <= problem.value(current.state):
+        neighbor, delta = best_neighbor(problem, current)
+        if neighbor is None or delta <= 0:
             break 
         current = neighbor
     return current.state
@@ -20,13 +54,10 @@ def hill_climbing_sideways(problem, max_consecutive_sideways, initial=None):
     current = Node(initial if initial is not None else problem.initial)
     consec = 0
     while True:
-        neighbors = current.expand(problem)
-        if not neighbors:
-            break
-        neighbor = argmax_random_tie(neighbors, key=lambda node: problem.value(node.state))
-        if problem.value(neighbor.state) < problem.value(current.state):
+        neighbor, delta = best_neighbor(problem, current)
+        if neighbor is None or delta < 0:
             break
-        if problem.value(neighbor.state) == problem.value(current.state):
+        if delta == 0:
             consec = consec + 1
         else:
             consec = 0
@@ -38,7 +69,14 @@ def hill_climbing_sideways(problem, max_consecutive_sideways, initial=None):
 # Stochastic hill climbing (without sideways)
 def stochastic_hill_climbing(problem: Problem, initial=None):
     current = Node(initial if initial is not None else problem.initial)
+    delta_value = getattr(problem, 'delta_value', None)
     while True:
+        if delta_value is not None:
+            uphill = [a for a in problem.actions(current.state) if delta_value(current.state, a) > 0]
+            if not uphill:
+                break
+            current = current.child_node(problem, random.choice(uphill))
+            continue
         neighbors = current.expand(problem)
         current_value = problem.value(current.state)
         if not neighbors:
@@ -53,15 +91,19 @@ def stochastic_hill_climbing(problem: Problem, initial=None):
 # First choice hill climbing
 def first_choice_hill_climbing(problem: Problem, initial=None):
     current = Node(initial if initial is not None else problem.initial)
+    delta_value = getattr(problem, 'delta_value', None)
     while True:
         old_state = current.state 
-        actions = problem.actions(current.state)
-        for a in actions:
-            result = problem.result(current.state, a) # result state
-            if problem.value(result) > problem.value(current.state):
-                next_node = Node(result, current, a, problem.path_cost(current.path_cost, current.state, a, result))
-                current = next_node
-                break
+        if delta_value is not None:
+            action = next((a for a in problem.actions(current.state) if delta_value(current.state, a) > 0), None)
+            if action is not None:
+                current = current.child_node(problem, action)
+        else:
+            current_value = problem.value(current.state)
+            for child in current.iter_expand(problem):  # stop generating at the first improving move
+                if problem.value(child.state) > current_value:
+                    current = child
+                    break
         if current.state == old_state:  
             break # in local maximum 
     return current.state 
@@ -76,34 +118,80 @@ def random_restart_hill_climbing(problem: Problem):
             break
     return current
 
-# Local beam search. Stop when max_nodes have been expanded. 
-def local_beam_search(problem: Problem, k=10, max_nodes=10000):
-    nodes = [Node(problem.random_state()) for i in range(k)]
-    visited = set()  # closed list 
-    while True:
-        # neighbors should not have repeated elements 
-        neighbors = list(set([candidate for node in nodes for candidate in node.expand(problem) if candidate.state not in visited]))
-        nodes = sorted(neighbors, key=lambda node: problem.value(node.state))[:k]
-        # update visited 
-        visited.update(nodes)
-        if len(visited) > max_nodes:
-            break
-    return argmax_random_tie(nodes, lambda node: problem.value(node.state))
+# Local beam search
+class VisitedSet:
+    """States already in a beam, bounded to maxsize states (None: unbounded). When
+    full, the oldest ('fifo') or least recently seen ('lru') state is forgotten."""
+
+    def __init__(self, maxsize=None, policy='fifo'):
+        if policy not in ('fifo', 'lru'):
+            raise ValueError("Policy must be either 'fifo' or 'lru'.")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.states = collections.OrderedDict()
 
-# Stochastic local beam search
-def stochastic_local_beam_search(problem: Problem, k=10, max_nodes=10000):
+    def __contains__(self, state):
+        if state not in self.states:
+            return False
+        if self.policy == 'lru':
+            self.states.move_to_end(state)
+        return True
+
+    def add(self, state):
+        self.states[state] = None
+        self.states.move_to_end(state)
+        if self.maxsize is not None and len(self.states) > self.maxsize:
+            self.states.popitem(last=False)
+
+# Values of a list of states as an array, in one call to the optional
+# problem.value_batch(states) when the problem has one
+def value_batch(problem, states):
+    batch = getattr(problem, 'value_batch', None)
+    return np.asarray(batch(states) if batch is not None else [problem.value(s) for s in states], dtype=float)
+
+# k beams; each step the distinct unvisited neighbors of all the beams are evaluated in
+# one batch and select(values, k) picks the indices of the next beams. Stops at a goal,
+# when there are no new neighbors, or once max_nodes neighbors have been generated, and
+# returns the best state of the beams.
+def beam_local_search(problem, k, max_nodes, select, visited_size=None, policy='fifo'):
     nodes = [Node(problem.random_state()) for i in range(k)]
-    visited = set()  # closed list 
-    while True:
-        neighbors = list(set([candidate for node in nodes for candidate in node.expand(problem) if candidate.state not in visited]))
-        # choose k based weighted distribution
-        f_values = map(lambda node: problem.value(node.state), neighbors)
-        sampler = weighted_sampler(neighbors, f_values)
-        nodes = [sampler() for i in range(k)]
-        visited.update(nodes)
-        if len(visited) > max_nodes:
+    values = value_batch(problem, [node.state for node in nodes])
+    visited = VisitedSet(visited_size, policy)  # hashed by state
+    for node in nodes:
+        visited.add(node.state)
+    generated = 0
+    while generated < max_nodes and not any(problem.goal_test(node.state) for node in nodes):
+        neighbors = {}
+        for node in nodes:
+            for child in node.iter_expand(problem, visited):
+                neighbors.setdefault(child.state, child)
+        if not neighbors:
             break
-    return argmax_random_tie(nodes, lambda node: problem.value(node.state))
+        neighbors = list(neighbors.values())
+        generated += len(neighbors)
+        neighbor_values = value_batch(problem, [node.state for node in neighbors])
+        chosen = select(neighbor_values, min(k, len(neighbors)))
+        nodes, values = [neighbors[i] for i in chosen], neighbor_values[chosen]
+        for node in nodes:
+            visited.add(node.state)
+    return nodes[int(values.argmax())].state
+
+# Local beam search: the k best neighbors (argpartition, no full sort)
+def local_beam_search(problem: Problem, k=10, max_nodes=10000, visited_size=None, policy='fifo'):
+    def best(values, k):
+        return np.argpartition(-values, k - 1)[:k] if len(values) > k else np.arange(len(values))
+    return beam_local_search(problem, k, max_nodes, best, visited_size, policy)
+
+# Stochastic local beam search: k distinct neighbors drawn at once, with probability
+# proportional to exp(value / temperature) (so negative values are fine)
+def stochastic_local_beam_search(problem: Problem, k=10, max_nodes=10000, visited_size=None, policy='fifo',
+                                 temperature=1.0, seed=None):
+    rng = np.random.default_rng(random.randrange(2 ** 32) if seed is None else seed)
+
+    def draw(values, k):
+        weights = np.maximum(np.exp((values - values.max()) / temperature), np.finfo(float).tiny)  # k nonzero
+        return rng.choice(len(values), size=k, replace=False, p=weights / weights.sum())
+    return beam_local_search(problem, k, max_nodes, draw, visited_size, policy)
 
 
 # Simulated annealing
@@ -112,21 +200,155 @@ def exp_schedule(k=20, lam=0.005, limit=100):
     return lambda t: (k * np.exp(-lam * t) if t < limit else 0)
 
 
-def simulated_annealing(problem, schedule=exp_schedule()):
-    current = Node(problem.initial)
+def simulated_annealing(problem, schedule=exp_schedule(), initial=None):
+    current = Node(initial if initial is not None else problem.initial)
+    delta_value = getattr(problem, 'delta_value', None)
     for t in range(sys.maxsize):
         T = schedule(t) # as t grows larger, T decreases 
         if T == 0: # absolute zero temperature 
             return current.state
-        neighbors = current.expand(problem)
-        if not neighbors:
+        actions = problem.actions(current.state)
+        if not isinstance(actions, collections.abc.Sequence):  # e.g. dict_keys or a generator
+            actions = list(actions)
+        if not actions:
             return current.state
-        next_choice = random.choice(neighbors)
+        action = random.choice(actions)
+        if delta_value is not None:
+            delta_e = delta_value(current.state, action)
+            if delta_e > 0 or probability(np.exp(delta_e / T)):
+                current = current.child_node(problem, action)  # only build accepted neighbors
+            continue
+        next_choice = current.child_node(problem, action)  # only build the chosen neighbor
         delta_e = problem.value(next_choice.state) - problem.value(current.state)
         if delta_e > 0 or probability(np.exp(delta_e / T)):
             current = next_choice
 
 
+# Parallel random restart (portfolio) hill climbing
+# Workers (fork start method) run restarts from random states with independent seeds,
+# cycling through the given algorithms. The first restart that reaches a goal cancels
+# all the others; so do the global budgets: max_restarts, timeout (seconds) and
+# max_evaluations (calls to value and delta_value, over all workers; checked before
+# every restart and every RestartProblem.check_every calls within one, so it can be
+# overshot by at most workers * check_every). Returns the best
+# state seen and one record per restart: worker, algorithm, status ('solved',
+# 'local_optimum', 'cancelled', 'timeout' or 'evaluation_limit'), value, evaluations
+# and seconds.
+restart_algorithms = {
+    'hill_climbing': hill_climbing,
+    'hill_climbing_sideways': lambda problem, initial: hill_climbing_sideways(problem, 100, initial),
+    'stochastic_hill_climbing': stochastic_hill_climbing,
+    'first_choice_hill_climbing': first_choice_hill_climbing,
+    'simulated_annealing': lambda problem, initial: simulated_annealing(problem, initial=initial),
+}
+
+class RestartCancelled(Exception):
+    pass
+
+class RestartProblem(ProblemWrapper):
+    """Delegates to problem, counting value and delta_value calls. One per worker:
+    every check_every calls the count is added to the shared total and check_budget
+    raises RestartCancelled if the worker has to stop."""
+    check_every = 256
+
+    def __init__(self, problem, shared):
+        super().__init__(problem)
+        self.shared = shared
+        self.evaluations = 0  # by this worker
+        self.unreported = 0  # not yet added to the shared total
+        if hasattr(problem, 'delta_value'):
+            self.delta_value = self.counted_delta_value
+
+    def check(self):
+        self.evaluations += 1
+        self.unreported += 1
+        if self.unreported >= self.check_every:
+            self.check_budget()
+
+    def check_budget(self):
+        stop, deadline, max_evaluations, evaluations = self.shared
+        with evaluations.get_lock():
+            evaluations.value += self.unreported
+            total = evaluations.value
+        self.unreported = 0
+        if stop.is_set():
+            raise RestartCancelled('cancelled')
+        if deadline is not None and time.perf_counter() > deadline:
+            stop.set()
+            raise RestartCancelled('timeout')
+        if max_evaluations is not None and total >= max_evaluations:
+            stop.set()
+            raise RestartCancelled('evaluation_limit')
+
+    def value(self, state):
+        self.check()
+        return self.problem.value(state)
+
+    def counted_delta_value(self, state, action):
+        self.check()
+        return self.problem.delta_value(state, action)
+
+# Sends (records, error) once, even if a restart raises: error is None or the exception
+# as text, and the other workers are then cancelled
+def restart_worker(i, problem, algorithms, seed, shared, restarts, max_restarts, results):
+    records, error = [], None
+    try:
+        random.seed(seed)
+        stop = shared[0]
+        counted = RestartProblem(problem, shared)
+        k = i
+        while True:
+            try:  # budgets are checked before every restart, however short the restarts are
+                counted.check_budget()
+            except RestartCancelled:
+                break
+            with restarts.get_lock():
+                if max_restarts is not None and restarts.value >= max_restarts:
+                    break
+                restarts.value += 1
+            name = algorithms[k % len(algorithms)]
+            k += 1
+            start, evaluations = time.perf_counter(), counted.evaluations
+            try:
+                state = restart_algorithms[name](counted, problem.random_state())
+                status = 'solved' if problem.goal_test(state) else 'local_optimum'
+            except RestartCancelled as exc:
+                state, status = None, exc.args[0]
+            records.append({'worker': i, 'algorithm': name, 'status': status, 'state': state,
+                            'value': problem.value(state) if state is not None else None,
+                            'evaluations': counted.evaluations - evaluations,
+                            'seconds': time.perf_counter() - start})
+            if status == 'solved':
+                stop.set()
+    except Exception as exc:
+        error = f'{type(exc).__name__}: {exc}'
+        shared[0].set()
+    finally:
+        results.put((records, error))
+
+def parallel_random_restart(problem, algorithms=('hill_climbing',), workers=4, max_restarts=None, timeout=None,
+                            max_evaluations=None, seed=None):
+    ctx = multiprocessing.get_context('fork')
+    deadline = time.perf_counter() + timeout if timeout is not None else None
+    shared = (ctx.Event(), deadline, max_evaluations, ctx.Value('q', 0))
+    restarts, results = ctx.Value('q', 0), ctx.Queue()
+    rng = random.Random(seed)
+    processes = [ctx.Process(target=restart_worker, args=(i, problem, list(algorithms), rng.randrange(2 ** 32),
+                                                          shared, restarts, max_restarts, results))
+                 for i in range(workers)]
+    for p in processes:
+        p.start()
+    reports = gather_results(results, processes, workers)
+    for p in processes:
+        p.join()
+    errors = [error for _, error in reports if error is not None]
+    if errors:
+        raise RuntimeError(f"parallel_random_restart worker failed: {errors[0]}")
+    records = [record for worker_records, _ in reports for record in worker_records]
+    finished = [r for r in records if r['state'] is not None]
+    best = max(finished, key=lambda r: r['value'])['state'] if finished else None
+    return best, records
+
 # Genetic algorithm (basic)
 def genetic_algorithm(population, fitness_f, gene_pool=[0,1], f_thres=None, ngen=1000, pmut=0.1):
     """
@@ -183,12 +405,136 @@ def recombine_uniform(x, y):
         result[idx] = x[idx] if i < n/2 else y[idx]
     return "".join(str(r) for r in result)
 
+# Island-model genetic algorithm
+# The population is split into `islands` populations evolved by genetic_algorithm's
+# operators in worker processes (fork start method). Every migration_interval
+# generations each island sends copies of its `migrants` fittest individuals to its
+# neighbors, ring (i -> i+1) or all-to-all, where they replace the least fit. With
+# synchronous migration an island waits for its neighbors' migrants of the same round
+# before going on; asynchronous islands take whatever has arrived. All islands stop as
+# soon as one passes f_thres (fitness_threshold). stats (a SearchStats, if given) gets
+# in islands the generations run, best fitness and seconds of each island.
+def island_worker(i, population, fitness_f, gene_pool, f_thres, ngen, pmut, config, inboxes, results, stop, seed):
+    migration_interval, migrants, topology, synchronous = config
+    islands = len(inboxes)
+    random.seed(seed)
+    targets = [(i + 1) % islands] if topology == 'ring' else [j for j in range(islands) if j != i]
+    sources = 1 if topology == 'ring' else islands - 1
+    pending = collections.defaultdict(list)  # migration round -> batches received
+    start, generation = time.perf_counter(), 0
+    while generation < ngen and not stop.is_set():
+        population = [mutate(recombine(*select(2, population, fitness_f)), gene_pool, pmut)
+                      for _ in range(len(population))]
+        generation += 1
+        if fitness_threshold(fitness_f, f_thres, population):
+            stop.set()
+            break
+        if islands == 1 or generation % migration_interval:
+            continue
+        round_ = generation // migration_interval
+        best = sorted(population, key=fitness_f, reverse=True)[:migrants]
+        for j in targets:
+            inboxes[j].put((round_, best))
+        while True:  # collect migrants
+            try:
+                r, batch = inboxes[i].get(timeout=0.01) if synchronous else inboxes[i].get_nowait()
+                pending[r].append(batch)
+            except queue.Empty:
+                if not synchronous or stop.is_set():
+                    break
+            if synchronous and len(pending[round_]) == sources:
+                break
+        arrived = [x for r in sorted(pending) if not synchronous or r == round_ for batch in pending[r] for x in batch]
+        for r in [r for r in pending if not synchronous or r == round_]:
+            del pending[r]
+        if arrived:
+            population.sort(key=fitness_f)
+            population[:len(arrived)] = arrived[:len(population)]
+    best = max(population, key=fitness_f)
+    results.put((i, best, fitness_f(best), generation, time.perf_counter() - start))
+
+def island_genetic_algorithm(population, fitness_f, gene_pool=[0,1], f_thres=None, ngen=1000, pmut=0.1, islands=4,
+                             migration_interval=10, migrants=2, topology='ring', synchronous=True, seed=None,
+                             stats=None):
+    if topology not in ('ring', 'all'):
+        raise ValueError("Topology must be either 'ring' or 'all'.")
+    if len(population) < islands:
+        raise ValueError(f"A population of {len(population)} cannot fill {islands} islands.")
+    ctx = multiprocessing.get_context('fork')
+    inboxes = [ctx.Queue() for _ in range(islands)]
+    results = ctx.Queue()
+    stop = ctx.Event()
+    config = (migration_interval, migrants, topology, synchronous)
+    rng = random.Random(seed)
+    processes = [ctx.Process(target=island_worker, args=(i, population[i::islands], fitness_f, gene_pool, f_thres,
+                                                         ngen, pmut, config, inboxes, results, stop,
+                                                         rng.randrange(2 ** 32)))
+                 for i in range(islands)]
+    for p in processes:
+        p.start()
+    try:
+        reports = sorted(gather_results(results, processes, islands))
+    except RuntimeError:
+        stop.set()
+        raise
+    for p in processes:
+        while p.is_alive():  # drain migrants nobody reads, so that no sender blocks on exit
+            for inbox in inboxes:
+                try:
+                    while True:
+                        inbox.get_nowait()
+                except queue.Empty:
+                    pass
+            p.join(0.01)
+    if stats is not None:
+        stats.islands = [{'generations': g, 'fitness': f, 'seconds': t} for _, _, f, g, t in reports]
+        stats.generations = sum(g for _, _, _, g, _ in reports)
+    return max(reports, key=lambda report: report[2])[1]
+
+# Genetic algorithm on a NumPy population matrix (one individual per row)
+# fitness_batch(population) returns the fitness of every row at once. Each generation
+# draws all the parents in one go (roulette: proportional to fitness, shifted to be
+# non-negative; tournament: best of tournament_size), recombines them with one random
+# cut per child and mutates, with probability pmut, one random gene per child, all as
+# array operations. The elite fittest individuals are copied unchanged. stats (a
+# SearchStats, if given) gets the generations run and their wall_time.
+def vectorized_genetic_algorithm(population, fitness_batch, gene_pool, f_thres=None, ngen=1000, pmut=0.1,
+                                 selection='roulette', tournament_size=3, elite=0, seed=None, stats=None):
+    if selection not in ('roulette', 'tournament'):
+        raise ValueError("Selection must be either 'roulette' or 'tournament'.")
+    rng = np.random.default_rng(seed)
+    population, gene_pool = np.asarray(population), np.asarray(gene_pool)
+    n, length = population.shape
+    positions = np.arange(length)
+    fitness = fitness_batch(population)
+    start, generation = time.perf_counter(), 0
+    while generation < ngen and not (f_thres is not None and fitness.max() >= f_thres):
+        if selection == 'roulette':
+            weights = fitness - min(fitness.min(), 0)
+            total = weights.sum()
+            parents = rng.choice(n, size=(n, 2), p=weights / total if total > 0 else None)
+        else:
+            contenders = rng.integers(n, size=(n, 2, tournament_size))
+            parents = np.take_along_axis(contenders, fitness[contenders].argmax(axis=2)[..., None], axis=2)[..., 0]
+        cut = rng.integers(length, size=n)
+        children = np.where(positions < cut[:, None], population[parents[:, 0]], population[parents[:, 1]])
+        mutants = np.flatnonzero(rng.random(n) < pmut)
+        children[mutants, rng.integers(length, size=len(mutants))] = rng.choice(gene_pool, size=len(mutants))
+        if elite:
+            children[:elite] = population[np.argsort(fitness)[-elite:]]
+        population, fitness = children, fitness_batch(children)
+        generation += 1
+    if stats is not None:
+        stats.generations += generation
+        stats.wall_time += time.perf_counter() - start
+    return population[fitness.argmax()]
+
 # Generate random population from gene pool
 def init_population(pop_number: int, gene_pool, state_length: int):
     population = []
     g = len(gene_pool)
     for i in range(pop_number):
-        new_individual = [gene_pool[random.randrange(0, g) for j in range(state_length)]
+        new_individual = [gene_pool[random.randrange(0, g)] for j in range(state_length)]
         population.append(new_individual)
     return population
 
@@ -244,21 +590,45 @@ class NQueensProblem(Problem):
 
         return num_conflicts
 
+class QueenMoves(collections.abc.Sequence):
+    """The N(N-1) actions (row, col) of a CompleteStateNQueens state as a lazy sequence,
+    so that random.choice picks a move without building all of them."""
+    def __init__(self, state, N):
+        self.state = state
+        self.N = N
+
+    def __len__(self):
+        return self.N * (self.N - 1)
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        c, r = divmod(i, self.N - 1)
+        return (r if r < self.state[c] else r + 1, c)
+
+    def __iter__(self):
+        for c, row in enumerate(self.state):
+            for r in range(self.N):
+                if r != row:
+                    yield (r, c)
+
 # For local search 
+# Queens per row and per diagonal are counted for the current state (O(N) once, then
+# updated in O(1) by result), which makes delta_value O(1) instead of O(N^2).
 class CompleteStateNQueens(Problem):
     def __init__(self, N):
         self.N = N
+        self.counted, self.counts = None, None  # last counted state and its counters
         super().__init__(self.random_state()) # change 
 
     def random_state(self):
-        return tuple([r for c in range(self.N) for r in range(self.N)])
+        return tuple(random.randrange(self.N) for c in range(self.N))
 
     def actions(self, state):
         """
         Change any column to any value not already in. Conflicting states are allowed. 
         """
-        return [tuple(r, c) for r in range(self.N) for c in range(self.N)
-                if state[c] != r]
+        return QueenMoves(state, self.N)
     
     def result(self, state, action):
         """
@@ -266,7 +636,18 @@ class CompleteStateNQueens(Problem):
         """
         new = list(state[:])
         new[action[1]] = action[0]
-        return tuple(new) 
+        new = tuple(new)
+        if state is self.counted:  # move the counters along with the queen, O(1)
+            (r, c), r0, N = action, state[action[1]], self.N
+            rows, diagonals, anti_diagonals = self.counts
+            rows[r0] -= 1
+            diagonals[r0 - c + N - 1] -= 1
+            anti_diagonals[r0 + c] -= 1
+            rows[r] += 1
+            diagonals[r - c + N - 1] += 1
+            anti_diagonals[r + c] += 1
+            self.counted = new
+        return new 
 
     def conflicted(self, state, row, col):
         """Would placing a queen at (row, col) conflict with anything?"""
@@ -282,21 +663,70 @@ class CompleteStateNQueens(Problem):
 
     def goal_test(self, state):
         """Check if no conflicts."""
-        return not any(self.conflicted(state, state[col], col)
-                       for col in range(len(state)))
+        return self.h(Node(state)) == 0
+
+    def value(self, state):
+        """Objective for local search: fewer conflicts is better."""
+        return -self.h(Node(state))
+
+    def counters(self, state):
+        """Queens per row, per \\ diagonal (r - c + N - 1) and per / diagonal (r + c)."""
+        if state is not self.counted:
+            N = self.N
+            rows, diagonals, anti_diagonals = [0] * N, [0] * (2 * N - 1), [0] * (2 * N - 1)
+            for c, r in enumerate(state):
+                rows[r] += 1
+                diagonals[r - c + N - 1] += 1
+                anti_diagonals[r + c] += 1
+            self.counted, self.counts = state, (rows, diagonals, anti_diagonals)
+        return self.counts
 
     def h(self, node):
-        """Return number of conflicting queens for a given node"""
-        num_conflicts = 0
-        for (r1, c1) in enumerate(node.state):
-            for (r2, c2) in enumerate(node.state):
-                if (r1, c1) != (r2, c2):
-                    num_conflicts += self.conflict(r1, c1, r2, c2)
-        return num_conflicts
+        """Return number of conflicting queens for a given node (ordered pairs, so
+        each conflicting pair counts twice): k queens on a line give k(k-1)."""
+        return sum(k * (k - 1) for line in self.counters(node.state) for k in line)
+
+    def value_batch(self, states):
+        """value of a list (or array) of states, at once."""
+        return -self.h_batch(states)
+
+    def h_batch(self, states):
+        """h of every row of a states array, with one bincount per kind of line."""
+        states = np.asarray(states)
+        P, N = states.shape
+        offsets = np.arange(P)[:, None]
+        total = np.zeros(P, dtype=np.int64)
+        for lines, size in ((states, N), (states - np.arange(N) + N - 1, 2 * N - 1), (states + np.arange(N), 2 * N - 1)):
+            k = np.bincount((lines + offsets * size).ravel(), minlength=P * size).reshape(P, size)
+            total += (k * (k - 1)).sum(axis=1)
+        return total
+
+    def delta_value(self, state, action):
+        """value(result(state, action)) - value(state) in O(1): the queen leaving its row
+        and diagonals stops attacking the others there, and starts attacking the
+        queens on its new row and diagonals."""
+        r, c = action
+        r0 = state[c]
+        if r == r0:
+            return 0
+        rows, diagonals, anti_diagonals = self.counters(state)
+        N = self.N
+        lost = rows[r0] + diagonals[r0 - c + N - 1] + anti_diagonals[r0 + c] - 3
+        gained = rows[r] + diagonals[r - c + N - 1] + anti_diagonals[r + c]
+        return -2 * (gained - lost)
 
 # Use Genetic algorithm to solve N queens
-def nqueens_genetic_algorithm(problem: CompleteStateNQueens, ngen=1000, pmut=0.1, n=20):
+# Fitness is the number of non-attacking pairs of queens, N(N-1)/2 for a solution.
+# On an InstrumentedProblem, the generations run go to its SearchStats.
+def nqueens_genetic_algorithm(problem: CompleteStateNQueens, ngen=1000, pmut=0.1, n=20, selection='tournament',
+                              elite=2, seed=None):
+    N = problem.N
+    rng = np.random.default_rng(seed)
     # randomly generate an initial population of n states
-    population = [problem.random_state() for i in range(n)]
-    return genetic_algorithm(population, lambda node: problem.N - problem.h(node), [i in range(N)], N, ngen, pmut)
+    population = rng.integers(N, size=(n, N))
+    max_pairs = N * (N - 1) // 2
+    best = vectorized_genetic_algorithm(population, lambda states: max_pairs - problem.h_batch(states) // 2,
+                                        np.arange(N), max_pairs, ngen, pmut, selection, elite=elite, seed=rng,
+                                        stats=search_stats(problem))
+    return tuple(best.tolist())
     
\ No newline at end of file
@@ -1,7 +1,11 @@
 import functools 
+import collections
 import heapq
 import random 
 import bisect
+import itertools
+import time
+import queue
 
 def is_in(elt, seq):
     """Similar to (elt in seq), but comparing with 'is' """
@@ -29,14 +33,134 @@ def memoize(fn, slot=None, maxsize=32):
 
     return memoized_fn
 
+class HeuristicCache:
+    """State-keyed cache for a heuristic h(node): nodes that share a state share one
+    evaluation, and the value is also kept in the node's h slot.
+    maxsize=None means unbounded; otherwise the least recently used ('lru') entry
+    or, with less bookkeeping per hit, an entry chosen by the CLOCK ('clock')
+    second-chance policy is evicted. hits and misses count state lookups."""
+
+    def __init__(self, h, maxsize=None, policy='lru'):
+        if policy not in ('lru', 'clock'):
+            raise ValueError("Policy must be either 'lru' or 'clock'.")
+        self.h = h
+        self.maxsize = maxsize
+        self.policy = policy
+        self.hits = 0
+        self.misses = 0
+        if maxsize is not None and policy == 'clock':
+            self.index = {}  # state -> slot
+            self.keys = [None] * maxsize
+            self.values = [None] * maxsize
+            self.referenced = bytearray(maxsize)
+            self.hand = 0
+        else:
+            self.index = collections.OrderedDict() if maxsize is not None else {}
+
+    def __call__(self, node):
+        try:
+            return node.h
+        except AttributeError:
+            pass
+        val = self.lookup(node)
+        node.h = val
+        return val
+
+    def lookup(self, node):
+        state = node.state
+        if self.maxsize is None:
+            if state in self.index:
+                self.hits += 1
+                return self.index[state]
+            self.misses += 1
+            val = self.index[state] = self.h(node)
+        elif self.policy == 'lru':
+            if state in self.index:
+                self.hits += 1
+                self.index.move_to_end(state)
+                return self.index[state]
+            self.misses += 1
+            val = self.index[state] = self.h(node)
+            if len(self.index) > self.maxsize:
+                self.index.popitem(last=False)
+        else:
+            i = self.index.get(state)
+            if i is not None:
+                self.hits += 1
+                self.referenced[i] = 1
+                return self.values[i]
+            self.misses += 1
+            val = self.h(node)
+            if len(self.index) < self.maxsize:
+                i = len(self.index)
+            else:
+                while self.referenced[self.hand]:  # second chance
+                    self.referenced[self.hand] = 0
+                    self.hand = (self.hand + 1) % self.maxsize
+                i = self.hand
+                del self.index[self.keys[i]]
+                self.hand = (self.hand + 1) % self.maxsize
+            self.index[state], self.keys[i], self.values[i], self.referenced[i] = i, state, val, 1
+        return val
+
+def memoize_heuristic(h, maxsize=None, policy='lru'):
+    """Wrap h in a HeuristicCache, unless it already is one (so that callers can pass
+    their own configured cache to a search)."""
+    return h if isinstance(h, HeuristicCache) else HeuristicCache(h, maxsize, policy)
+
+def memoize_node_heuristic(h):
+    """For the linear- or bounded-memory searches (IDA*, RBFS, SMA*): keep h(node) in
+    the node's h slot only, since a state-keyed table would grow with every state
+    generated. A HeuristicCache passed by the caller (who chose its size) is kept."""
+    return h if isinstance(h, HeuristicCache) else memoize(h, 'h')
+
 # Problem and node classes
+class GoalSet:
+    """Set of goal states with O(1) membership. A state is a goal if key(state) is
+    in keys and, if given, predicate(state) holds; key defaults to the state itself.
+    e.g. GoalSet(cities, key=lambda s: s.location) for "reach any of these cities".
+    Iterating yields the goal states, so it needs key=None: with a key, keys are not states."""
+
+    def __init__(self, keys, key=None, predicate=None):
+        self.keys = frozenset(keys)
+        self.key = key
+        self.predicate = predicate
+
+    def __contains__(self, state):
+        k = state if self.key is None else self.key(state)
+        return k in self.keys and (self.predicate is None or self.predicate(state))
+
+    def __iter__(self):
+        if self.key is not None:
+            raise ValueError("A GoalSet with a key cannot list its goal states.")
+        return (s for s in self.keys if self.predicate is None or self.predicate(s))
+
 class Problem:
-    """The abstract class for a formal problem. """
+    """The abstract class for a formal problem.
+    goal is a single state, or a list, set or GoalSet of goal states; several goals
+    are kept in a hashed GoalSet (self.goals) so that goal_test does not scan them."""
     
     def __init__(self, initial, goal=None) -> None:
         self.initial = initial
         self.goal = goal 
 
+    @property
+    def goal(self):
+        return self._goal
+
+    @goal.setter
+    def goal(self, goal):
+        self._goal = goal
+        if isinstance(goal, GoalSet):
+            self.goals = goal
+        elif isinstance(goal, (list, set, frozenset)):
+            try:
+                self.goals = GoalSet(goal)
+            except TypeError:  # unhashable states: equality scan
+                self.goals = goal
+        else:
+            self.goals = None
+
     def actions(self, state):
         raise NotImplementedError
 
@@ -44,8 +168,8 @@ class Problem:
         raise NotImplementedError
 
     def goal_test(self, state):
-        if isinstance(self.goal, list):
-            return is_in(state, self.goal)
+        if self.goals is not None:
+            return state in self.goals
         else:
             return state == self.goal 
 
@@ -54,6 +178,11 @@ class Problem:
         assuming cost c to get to state1."""
         return c+1
 
+    def goal_states(self):
+        """List of the goal states, for searches that start from them (backward search,
+        heuristics); raises ValueError if goal is a GoalSet with a key."""
+        return list(self.goals) if self.goals is not None else [self.goal]
+
     def value(self, state):
         """For optimisation problems (local search)."""
         raise NotImplementedError
@@ -63,7 +192,12 @@ class Problem:
         raise NotImplementedError
 
 class Node:
-    """Node in search tree."""
+    """Node in search tree.
+    Uses __slots__ (no per-instance __dict__): on EightPuzzle a node with cached
+    f and h takes ~90 bytes instead of ~520 (state tuple excluded). f and h are declared so memoize(fn, 'f')
+    and recursive_best_first_search can still cache values on the node."""
+    __slots__ = ('state', 'parent', 'action', 'path_cost', 'depth', 'f', 'h')
+
     def __init__(self, state, parent=None, action=None, path_cost=0) -> None:
         self.state = state # current state
         self.parent = parent  # from which Node 
@@ -81,7 +215,16 @@ class Node:
 
     def expand(self, problem) -> list:
         """List of reachable nodes in one step."""
-        return [self.child_node(problem, action) for action in problem.actions(self.state)]
+        return list(self.iter_expand(problem))
+
+    def iter_expand(self, problem, exclude=None):
+        """Generate reachable nodes in one step, lazily. States in exclude
+        (any container supporting `in`) are skipped before a Node is built."""
+        for action in problem.actions(self.state):
+            next_state = problem.result(self.state, action)
+            if exclude is not None and next_state in exclude:
+                continue
+            yield Node(next_state, self, action, problem.path_cost(self.path_cost, self.state, action, next_state))
 
     def child_node(self, problem, action):
         next_state = problem.result(self.state, action)
@@ -102,16 +245,167 @@ class Node:
     def __hash__(self):
         return hash(self.state) 
 
+# Search instrumentation
+class SearchStats:
+    """Counters and timings of one search run.
+    expanded/generated and the time spent in actions, result and h are recorded by
+    InstrumentedProblem; searches report each expansion through expansion(), which
+    tracks the nodes added to the frontier and its peak size, and calls callback(stats)
+    every `every` expansions (counted by expanded, so the calls may come from any search).
+    Searches with more to tell fill the fields below: re_expanded, regenerated and
+    max_depth (RBFS, SMA*), evicted, peak_nodes and peak_bytes (SMA*), iterations
+    (iterative deepening), generations and islands (genetic algorithms)."""
+
+    def __init__(self, callback=None, every=1000):
+        self.expanded = 0
+        self.generated = 0
+        self.added = 0  # children that were put on the frontier
+        self.peak_frontier = 0
+        self.wall_time = 0.0
+        self.time_actions = 0.0
+        self.time_result = 0.0
+        self.time_h = 0.0
+        self.solution_depth = None
+        self.re_expanded = 0  # nodes expanded again after being forgotten
+        self.regenerated = 0  # children generated by those re-expansions
+        self.max_depth = 0
+        self.evicted = 0
+        self.peak_nodes = 0
+        self.peak_bytes = 0
+        self.iterations = []  # per depth limit: limit, generated, reused
+        self.generations = 0
+        self.islands = []  # per island: generations, fitness, seconds
+        self.callback = callback
+        self.every = every
+        self.next_callback = every  # value of expanded at which callback is next called
+
+    def expansion(self, added, frontier_size):
+        self.added += added
+        if frontier_size > self.peak_frontier:
+            self.peak_frontier = frontier_size
+        if self.callback is not None and self.expanded >= self.next_callback:
+            self.next_callback = self.expanded + self.every
+            self.callback(self)
+
+    @property
+    def pruned(self):
+        """Duplicates (or nodes over the bound) dropped instead of being put on the frontier."""
+        return max(self.generated - self.added, 0)
+
+    @property
+    def branching_factor(self):
+        """Effective branching factor b*: N + 1 = 1 + b* + b*^2 + ... + b*^d."""
+        d, n = self.solution_depth, self.generated
+        if not d or not n:
+            return None
+        lo, hi = 0.0, max((n + 1) ** (1 / d), 1.0)  # b*^d <= N + 1
+        for _ in range(60):
+            b = (lo + hi) / 2
+            total = d + 1 if b == 1 else (b ** (d + 1) - 1) / (b - 1)
+            lo, hi = (b, hi) if total < n + 1 else (lo, b)
+        return (lo + hi) / 2
+
+    def as_dict(self):
+        return {'expanded': self.expanded, 'generated': self.generated, 'pruned': self.pruned,
+                'peak_frontier': self.peak_frontier, 'branching_factor': self.branching_factor,
+                'wall_time': self.wall_time, 'time_actions': self.time_actions,
+                'time_result': self.time_result, 'time_h': self.time_h, 're_expanded': self.re_expanded,
+                'regenerated': self.regenerated, 'max_depth': self.max_depth, 'evicted': self.evicted,
+                'peak_nodes': self.peak_nodes, 'peak_bytes': self.peak_bytes, 'iterations': self.iterations,
+                'generations': self.generations, 'islands': self.islands}
+
+def timed(fn, stats, field):
+    """Wrap fn so that the time spent in it is added to stats.<field>."""
+    def timed_fn(*args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            setattr(stats, field, getattr(stats, field) + time.perf_counter() - start)
+    return timed_fn
+
+class ProblemWrapper(Problem):
+    """Delegates everything to problem; subclasses override the methods they count or
+    check. Attributes the wrapper lacks (h, delta_value, ...) are looked up on problem."""
+
+    def __init__(self, problem):
+        super().__init__(problem.initial, problem.goal)
+        self.problem = problem
+
+    def actions(self, state):
+        return self.problem.actions(state)
+
+    def result(self, state, action):
+        return self.problem.result(state, action)
+
+    def goal_test(self, state):
+        return self.problem.goal_test(state)
+
+    def path_cost(self, c, state1, action, state2):
+        return self.problem.path_cost(c, state1, action, state2)
+
+    def goal_states(self):
+        return self.problem.goal_states()
+
+    def value(self, state):
+        return self.problem.value(state)
+
+    def random_state(self):
+        return self.problem.random_state()
+
+    def __getattr__(self, attr):
+        if attr == 'problem':  # not set yet (e.g. while unpickling): no recursion
+            raise AttributeError(attr)
+        return getattr(self.problem, attr)
+
+class InstrumentedProblem(ProblemWrapper):
+    """Delegates to problem, counting and timing actions (one per expansion), result
+    (one per generated node) and h. Searches find the stats on problem.stats."""
+
+    def __init__(self, problem, stats=None):
+        super().__init__(problem)
+        self.stats = stats if stats is not None else SearchStats()
+        if hasattr(problem, 'h'):
+            self.h = timed(problem.h, self.stats, 'time_h')
+
+    def actions(self, state):
+        self.stats.expanded += 1
+        start = time.perf_counter()
+        actions = self.problem.actions(state)
+        self.stats.time_actions += time.perf_counter() - start
+        return actions
+
+    def result(self, state, action):
+        self.stats.generated += 1
+        start = time.perf_counter()
+        next_state = self.problem.result(state, action)
+        self.stats.time_result += time.perf_counter() - start
+        return next_state
+
+def search_stats(problem):
+    """SearchStats of problem if it is (or wraps) an InstrumentedProblem, else None."""
+    stats = getattr(problem, 'stats', None)
+    return stats if isinstance(stats, SearchStats) else None
+
 # Data structures
 class PriorityQueue:
     """A Queue in which the minimum (or maximum) element (as determined by f and
     order) is returned first.
     If order is 'min', the item with minimum f(x) is
     returned first; if order is 'max', then it is the item with maximum f(x).
-    Also supports dict-like lookup."""
+    Also supports dict-like lookup.
+    Items are indexed by key (for Node, its state) so that membership, lookup
+    and deletion are O(1); deleted entries are invalidated lazily in the heap
+    and skipped on pop, which makes decrease-key O(log n).
+    A Node is queued at most once per state: appending a Node whose state is
+    queued keeps the one with the better f. Other items are a multiset: equal
+    items are all queued."""
 
     def __init__(self, order='min', f=lambda x: x):
-        self.heap = []
+        self.heap = []  # entries [f(item), count, item, alive]
+        self.entries = {}  # item -> list of its live entries in heap
+        self.size = 0  # live entries
+        self.counter = itertools.count()  # tie-breaker, FIFO among equal f
         if order == 'min':
             self.f = f
         elif order == 'max':  # now item with max f(x)
@@ -120,8 +414,24 @@ class PriorityQueue:
             raise ValueError("Order must be either 'min' or 'max'.")
 
     def append(self, item):
-        """Insert item at its correct position."""
-        heapq.heappush(self.heap, (self.f(item), item))
+        """Insert item at its correct position. A Node whose state is already
+        queued replaces it only if its f is better, so append doubles as decrease-key."""
+        value = self.f(item)
+        queued = self.entries.get(item)
+        if queued is not None and isinstance(item, Node):
+            if queued[0][0] <= value:
+                return
+            self._invalidate(queued.pop())
+            self.size -= 1
+        entry = [value, next(self.counter), item, True]
+        if queued:
+            queued.append(entry)
+        else:
+            self.entries[item] = [entry]
+        self.size += 1
+        heapq.heappush(self.heap, entry)
+
+    add = append
 
     def extend(self, items):
         """Insert each item in items at its correct position."""
@@ -131,34 +441,70 @@ class PriorityQueue:
     def pop(self):
         """Pop and return the item (with min or max f(x) value)
         depending on the order."""
-        if self.heap:
-            return heapq.heappop(self.heap)[1]
-        else:
-            raise Exception('Trying to pop from empty PriorityQueue.')
+        while self.heap:
+            entry = heapq.heappop(self.heap)
+            if entry[-1]:
+                item = entry[2]
+                self._forget(item, entry)
+                return item
+        raise Exception('Trying to pop from empty PriorityQueue.')
+
+    def peek(self):
+        """Return (without removing) the item that pop would return."""
+        while self.heap and not self.heap[0][-1]:
+            heapq.heappop(self.heap)
+        if not self.heap:
+            raise Exception('Trying to peek into empty PriorityQueue.')
+        return self.heap[0][2]
+
+    def __iter__(self):
+        """Iterate over the queued items, in no particular order."""
+        for queued in self.entries.values():
+            for entry in queued:
+                yield entry[2]
 
     def __len__(self):
         """Return current capacity of PriorityQueue."""
-        return len(self.heap)
+        return self.size
 
     def __contains__(self, key):
         """Return True if the key is in PriorityQueue."""
-        return any([item == key for _, item in self.heap])
+        return key in self.entries
 
     def __getitem__(self, key):
-        """Returns the first value associated with key in PriorityQueue.
-        Raises KeyError if key is not present."""
-        for value, item in self.heap:
-            if item == key:
-                return value
-        raise KeyError(str(key) + " is not in the priority queue")
+        """Returns the value associated with key in PriorityQueue (the best one
+        if key is queued several times). Raises KeyError if key is not present."""
+        try:
+            queued = self.entries[key]
+        except KeyError:
+            raise KeyError(str(key) + " is not in the priority queue")
+        return min(entry[0] for entry in queued)
 
     def __delitem__(self, key):
-        """Delete the first occurrence of key."""
+        """Delete one occurrence of key."""
         try:
-            del self.heap[[item == key for _, item in self.heap].index(True)]
-        except ValueError:
+            entry = self.entries[key][-1]
+        except KeyError:
             raise KeyError(str(key) + " is not in the priority queue")
-        heapq.heapify(self.heap)
+        self._forget(key, entry)
+        self._invalidate(entry)
+
+    def _forget(self, item, entry):
+        """Drop entry from the index of item."""
+        queued = self.entries[item]
+        if len(queued) == 1:
+            del self.entries[item]
+        else:
+            queued.remove(entry)
+        self.size -= 1
+
+    def _invalidate(self, entry):
+        """Mark a heap entry as removed; compact when stale entries dominate."""
+        entry[-1] = False
+        entry[2] = None  # release the item
+        if len(self.heap) > 2 * self.size + 32:
+            self.heap = [e for e in self.heap if e[-1]]
+            heapq.heapify(self.heap)
 
 # ______________________________________________________________________________
 # argmin and argmax
@@ -197,4 +543,30 @@ def weighted_sampler(seq, weights):
     totals = []
     for w in weights:
         totals.append(w + totals[-1] if totals else w)
-    return lambda: seq[bisect.bisect(totals, random.uniform(0, totals[-1]))]
\ No newline at end of file
+    return lambda: seq[bisect.bisect(totals, random.uniform(0, totals[-1]))]
+# __________________________________________________________________________________
+# Worker processes
+
+def gather_results(results, processes, count, poll=0.1):
+    """Get count items from the results queue filled by processes. Raises RuntimeError
+    (after terminating the others) if a process exits before all the items came in."""
+    items = []
+    while len(items) < count:
+        try:
+            items.append(results.get(timeout=poll))
+            continue
+        except queue.Empty:
+            pass
+        dead = [p for p in processes if p.exitcode is not None]
+        if any(p.exitcode != 0 for p in dead) or len(dead) == len(processes):
+            try:  # the last items may have been sent just before exiting
+                items.append(results.get(timeout=poll))
+                continue
+            except queue.Empty:
+                pass
+            for p in processes:
+                if p.is_alive():
+                    p.terminate()
+            codes = [p.exitcode for p in dead]
+            raise RuntimeError(f"Worker process exited (exit codes {codes}) with {count - len(items)} result(s) missing.")
+    return items